@@ -0,0 +1,170 @@
+"""
+Headless HTTP API for the copilot.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+"""
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from google.api_core import exceptions as google_exceptions
+from pydantic import BaseModel
+
+from copilot_service import CopilotService
+from rag_system.llm import RETRYABLE, LLMError, circuit_states
+
+service = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global service
+    service = CopilotService()
+    # load the embedding model, FAISS indices and router centroids before the first request
+    await run_in_threadpool(service.warmup)
+    # answer new and still-open tickets in the background
+    service.start_workers()
+    yield
+    service.stop_workers()
+
+
+app = FastAPI(title="Customer Support Copilot", lifespan=lifespan)
+
+
+async def llm_unavailable(request, exc):
+    # Gemini still failing after the client's retries (or its circuit is open)
+    return JSONResponse(status_code=503, content={"detail": f"LLM unavailable: {exc}"})
+
+
+# only the client's own errors and Gemini's transient API errors: a bare TimeoutError or
+# ConnectionError may come from anything (e.g. a locked SQLite database)
+for exc_type in (LLMError, *(e for e in RETRYABLE if issubclass(e, google_exceptions.GoogleAPIError))):
+    app.add_exception_handler(exc_type, llm_unavailable)
+
+
+class AnalyzeRequest(BaseModel):
+    text: str
+
+
+class AnalyzeBatchRequest(BaseModel):
+    texts: List[str]
+
+
+class AnswerRequest(BaseModel):
+    query: str
+    label: Optional[str] = None
+
+
+class AnswerBatchRequest(BaseModel):
+    items: List[AnswerRequest]
+
+
+class TicketCreate(BaseModel):
+    subject: str
+    body: str
+    status: Optional[str] = "Open"
+    analyze: bool = True
+
+
+class TicketUpdate(BaseModel):
+    status: Optional[str] = None
+    answer: Optional[str] = None
+    analysis: Optional[dict] = None
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "llm_circuits": circuit_states(), "jobs": service.job_counts()}
+
+
+@app.post("/analyze")
+def analyze(req: AnalyzeRequest):
+    analysis = service.analyze(req.text)
+    if analysis is None:
+        raise HTTPException(502, "Analysis failed")
+    return analysis
+
+
+@app.post("/analyze/batch")
+def analyze_batch(req: AnalyzeBatchRequest):
+    return {"results": service.analyze_batch(req.texts)}
+
+
+@app.post("/answer")
+def answer(req: AnswerRequest):
+    return {"answer": service.answer(req.query, req.label)}
+
+
+@app.post("/answer/stream")
+def answer_stream(req: AnswerRequest):
+    return StreamingResponse(service.answer_stream(req.query, req.label), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/answer/batch")
+async def answer_batch(req: AnswerBatchRequest):
+    answers = await service.answer_batch([(item.query, item.label) for item in req.items])
+    return {"answers": answers}
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape endpoint
+    return PlainTextResponse(service.metrics_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/traces")
+def traces(limit: int = 20):
+    return service.telemetry(limit)
+
+
+@app.get("/tickets")
+def list_tickets(status: Optional[str] = None, priority: Optional[str] = None):
+    return service.list_tickets(status=status, priority=priority)
+
+
+@app.post("/tickets")
+def create_ticket(req: TicketCreate):
+    return service.create_ticket(req.subject, req.body, status=req.status, run_analysis=req.analyze)
+
+
+@app.post("/tickets/analyze")
+def analyze_pending():
+    return {"analyzed": service.analyze_pending()}
+
+
+@app.get("/jobs")
+def job_counts():
+    return service.job_counts()
+
+
+@app.post("/tickets/{ticket_id}/answer")
+def enqueue_answer(ticket_id: str, retry: bool = False):
+    job = service.enqueue_answer(ticket_id, retry=retry)
+    if job is None:
+        raise HTTPException(404, "Ticket not found")
+    return job
+
+
+@app.get("/tickets/{ticket_id}/job")
+def get_job(ticket_id: str):
+    job = service.get_job(ticket_id)
+    if job is None:
+        raise HTTPException(404, "No answer job for this ticket")
+    return job
+
+
+@app.get("/tickets/{ticket_id}")
+def get_ticket(ticket_id: str):
+    ticket = service.get_ticket(ticket_id)
+    if ticket is None:
+        raise HTTPException(404, "Ticket not found")
+    return ticket
+
+
+@app.patch("/tickets/{ticket_id}")
+def update_ticket(ticket_id: str, req: TicketUpdate):
+    if service.get_ticket(ticket_id) is None:
+        raise HTTPException(404, "Ticket not found")
+    return service.update_ticket(ticket_id, **req.model_dump(exclude_unset=True))
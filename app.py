@@ -1,21 +1,29 @@
 import json
+import threading
 from pathlib import Path
 
+import pandas as pd
 import streamlit as st
 
-from model import analyze
-from rag_system.pipeline import rag_answer
+from config import RAG_TOPICS, get_api_url
+from copilot_client import get_client
 
 # File paths
 TICKETS_DIR = Path("tickets")
-ANALYSIS_DIR = Path("analysis")
 SAMPLE_FILE = TICKETS_DIR / "sample_tickets.json"
-ANALYSIS_FILE = ANALYSIS_DIR / "analysis_tickets.json"
-LAST_ID_FILE = ANALYSIS_DIR / "last_id.txt"
 
-# Ensure dirs
-TICKETS_DIR.mkdir(parents=True, exist_ok=True)
-ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+
+@st.cache_resource
+def get_copilot():
+    # one client per server process: the HTTP API when COPILOT_API_URL is set,
+    # otherwise the pipeline in-process (knowledge base loaded once, kept across reruns).
+    # Warm-up (torch, FAISS, Gemini models) runs in the background so the first page renders right away.
+    copilot = get_client(get_api_url())
+    threading.Thread(target=copilot.warmup, name="copilot-warmup", daemon=True).start()
+    return copilot
+
+
+copilot = get_copilot()
 
 
 # Helpers
@@ -26,39 +34,6 @@ def load_json(file):
     return []
 
 
-def save_json(file, data):
-    with file.open("w") as f:
-        json.dump(data, f, indent=2)
-
-
-def run_analysis(ticket):
-    text = ticket["subject"] + " " + ticket["body"]
-    raw = analyze(text)
-    return {
-        "tags": raw.topic_tags,
-        "sentiment": raw.sentiment,
-        "priority": raw.priority,
-    }
-
-
-def get_next_ticket_id(analyzed_tickets):
-    """Generates next TICKET-X id using last_id.txt or fallback to last JSON entry."""
-    if LAST_ID_FILE.exists():
-        last_id = int(LAST_ID_FILE.read_text().strip())
-    else:
-        if analyzed_tickets:
-            last_ticket = analyzed_tickets[-1]
-            if "id" in last_ticket and last_ticket["id"].startswith("TICKET-"):
-                last_id = int(last_ticket["id"].split("-")[1])
-            else:
-                last_id = 244
-        else:
-            last_id = 244
-
-    next_id = last_id + 1
-    LAST_ID_FILE.write_text(str(next_id))
-    return f"TICKET-{next_id}"
-
 # Badge styling
 def badge(text, color="#7c5cff"):
     return f'<span style="background-color:{color};color:white;padding:4px 10px;border-radius:12px;margin-right:4px;font-size:12px;">{text}</span>'
@@ -73,119 +48,153 @@ sentiment_colors = {
     "Unknown": "#777777",
 }
 
+# Answer jobs run in the background (copilot workers); poll until the ticket's job is finished,
+# showing the answer as the worker streams it
+@st.fragment(run_every=0.5)
+def render_answer_job(ticket_id):
+    job = copilot.get_job(ticket_id)
+    if job is None:
+        st.warning("No answer job for this ticket.")
+        return
+    if job["status"] == "done":
+        # rerun the page so the stored answer and the feedback buttons show
+        st.rerun()
+
+    if job["status"] == "failed":
+        st.error(f"RAG failed: {job['error']}")
+        if st.button("🔁 Try again", key=f"retry_job_{ticket_id}"):
+            copilot.enqueue_answer(ticket_id, retry=True)
+            st.rerun()
+    elif job["status"] == "running" and job.get("partial"):
+        st.info(job["partial"] + " ▌")
+    elif job["status"] == "running":
+        st.info("⏳ Generating the answer...")
+    else:
+        st.info("⏳ Queued for answering, open P0 tickets go first...")
+
+
+@st.fragment(run_every="5s")
+def render_queue():
+    counts = copilot.job_counts()
+    st.caption(
+        f"Answer queue: {counts.get('queued', 0)} queued · {counts.get('running', 0)} running · "
+        f"{counts.get('done', 0)} done · {counts.get('failed', 0)} failed"
+    )
+
+
 # Ticket Answer + Human Feedback
 def handle_ticket_answer(ticket_id):
-    """Stable Streamlit ticket handler with RAG answer and feedback."""
-    testing = True
-    tickets = load_json(ANALYSIS_FILE)
-    ticket_index = next((i for i, t in enumerate(tickets) if t["id"] == ticket_id), None)
-    if ticket_index is None:
+    """Shows the ticket's background answer (queueing it when needed) and collects feedback."""
+    ticket = copilot.get_ticket(ticket_id)
+    if ticket is None:
         st.error("Ticket not found!")
         return
-    ticket = tickets[ticket_index]
 
     # Skip RAG if status is Resolved
     if ticket.get("status") == "Resolved":
         st.info("Ticket already resolved and added to ticket dashboard")
         return
 
-    # Keys for session_state
-    answer_key = f"answer_{ticket_id}"
     feedback_key = f"feedback_{ticket_id}"
+    status = ticket.get("status")
+    job = copilot.get_job(ticket_id)
+
+    # Not answered yet → queue it (no-op when already queued) and wait for the worker
+    if status in (None, "Open"):
+        job = copilot.enqueue_answer(ticket_id, retry=job is not None and job["status"] == "done")
+    if job is not None and job["status"] != "done" and status in (None, "Open", "Pending"):
+        render_answer_job(ticket_id)
+        return
 
     tags = ticket.get("analysis", {}).get("tags", [])
+    stored_answer = ticket.get("answer")
 
-    # Case 1: Already answered → just use stored answer
-    if ticket.get("status") == "Answered" and ticket.get("answer"):
-        st.session_state[answer_key] = ticket["answer"]
-
-    # Case 2: Open → run RAG if not already stored
-    elif ticket.get("status") == "Open" or answer_key not in st.session_state:
-        if not tags:
-            st.warning("Ticket analysis not ready yet. Please try again in a moment.")
-            return
-
-        # Only run RAG for supported tags
-        if any(tag in ["How-to", "Product", "Best practices", "API/SDK", "SSO"] for tag in tags):
-            with st.spinner("Finding answer..."):
-                try:
-                    rag_response = rag_answer(ticket.get("subject", "") + " " + ticket.get("body", ""))
-                except Exception as e:
-                    st.error(f"RAG failed: {e}")
-                    rag_response = None
-
-            st.session_state[answer_key] = rag_response
-            ticket["answer"] = rag_response
-            ticket["status"] = "Answered" if rag_response else "Pending"
-
-        else:
-            st.session_state[answer_key] = None
-            ticket["answer"] = None
-            ticket["status"] = "Pending"
-
-        tickets[ticket_index] = ticket
-        save_json(ANALYSIS_FILE, tickets)
+    # ---- Display answer ----
+    if not any(tag in RAG_TOPICS for tag in tags):
+        st.warning(f"ℹ️ Ticket classified as '{', '.join(tags)}'; routed to appropriate team and ticket raised in ticket dashboard")
+        return
+    if not stored_answer:
+        st.warning("No answer found in knowledge base.")
+        if st.button("🔁 Try again", key=f"retry_{ticket_id}"):
+            copilot.enqueue_answer(ticket_id, retry=True)
+            st.rerun()
+        return
+    st.info(stored_answer)
 
-    # ---- Display answer (only once) ----
-    stored_answer = st.session_state.get(answer_key)
-    if stored_answer:
-        st.info(stored_answer)
+    # ---- Feedback section ----
+    st.session_state.setdefault(feedback_key, None)
+
+    if st.session_state.get(feedback_key) is None:
+        col1, col2 = st.columns(2)
+        yes_clicked = col1.button("✅ YES, this helped", key=f"yes_{ticket_id}")
+        no_clicked  = col2.button("❌ No, still an issue", key=f"no_{ticket_id}")
+
+        if yes_clicked:
+            st.session_state[feedback_key] = "resolved"
+            copilot.update_ticket(ticket_id, status="Resolved")
+            st.success("✅ Ticket marked as Resolved and added to the dashboard.")
+            st.rerun()
+
+        if no_clicked:
+            st.session_state[feedback_key] = "rerouted"
+            copilot.update_ticket(ticket_id, status="Rerouted")
+            st.warning("❌ Ticket has been Rerouted and added to the dashboard.")
+            st.rerun()
     else:
-        if any(tag in ["How-to", "Product", "Best practices", "API/SDK", "SSO"] for tag in tags):
-            st.warning("No answer found in knowledge base.")
+        if st.session_state[feedback_key] == "resolved":
+            st.success("✅ Ticket marked as Resolved and added to the dashboard.")
         else:
-            st.warning(f"ℹ️ Ticket classified as '{', '.join(tags)}'; routed to appropriate team and ticket raised in ticket dashboard")
-            ticket['answer'] = f"Ticket classified as '{', '.join(tags)}'; routed to appropriate team"
-            ticket['status'] = 'Rerouted'
-            tickets[ticket_index] = ticket
-            save_json(ANALYSIS_FILE, tickets)
-            testing = False
+            st.warning("❌ Ticket has been Rerouted and added to the dashboard.")
 
-    # ---- Feedback section ----
-    if testing and stored_answer:
-        st.session_state.setdefault(feedback_key, None)
-
-        if st.session_state.get(feedback_key) is None:
-            col1, col2 = st.columns(2)
-            yes_clicked = col1.button("✅ YES, this helped", key=f"yes_{ticket_id}")
-            no_clicked  = col2.button("❌ No, still an issue", key=f"no_{ticket_id}")
-
-            if yes_clicked:
-                st.session_state[feedback_key] = "resolved"
-                ticket["status"] = "Resolved"
-                tickets[ticket_index] = ticket
-                save_json(ANALYSIS_FILE, tickets)
-                st.success("✅ Ticket marked as Resolved and added to the dashboard.")
-                st.rerun()
 
-            if no_clicked:
-                st.session_state[feedback_key] = "rerouted"
-                ticket["status"] = "Rerouted"
-                tickets[ticket_index] = ticket
-                save_json(ANALYSIS_FILE, tickets)
-                st.warning("❌ Ticket has been Rerouted and added to the dashboard.")
-                st.rerun()
-        else:
-            if st.session_state[feedback_key] == "resolved":
-                st.success("✅ Ticket marked as Resolved and added to the dashboard.")
-            else:
-                st.warning("❌ Ticket has been Rerouted and added to the dashboard.")
+# Pipeline metrics (live per-stage latency breakdown)
+@st.fragment(run_every="5s")
+def render_metrics():
+    data = copilot.telemetry(limit=20)
+    stages = data["stages"]
+    if not stages:
+        st.info("No requests traced yet. Answer a ticket to see the stage breakdown.")
+        return
 
+    st.markdown("**Latency per stage (recent requests, ms)**")
+    summary = pd.DataFrame.from_dict(stages, orient="index")
+    st.bar_chart(summary[["p50_ms", "p95_ms"]], stack=False)
+    st.dataframe(summary.round(2))
+
+    col1, col2 = st.columns(2)
+    col1.markdown("**Counters**")
+    col1.json(data["counters"])
+    col2.markdown("**Router**")
+    col2.json(data["router"])
+
+    st.markdown("**Recent traces**")
+    for trace in data["traces"]:
+        title = f"{trace['name']} · {trace['duration_ms']:.0f} ms"
+        if trace.get("error"):
+            title += " · ❌"
+        with st.expander(title):
+            rows = [
+                {
+                    "stage": s["name"],
+                    "start_ms": round((s["start"] - trace["start"]) * 1e3, 1),
+                    "duration_ms": s["duration_ms"],
+                    "attrs": json.dumps(s["attrs"], default=str),
+                    "error": s["error"],
+                }
+                for s in trace["spans"]
+            ]
+            st.dataframe(pd.DataFrame(rows), hide_index=True)
 
-# Load base + analyzed tickets
-sample_tickets = load_json(SAMPLE_FILE)
-analyzed_tickets = load_json(ANALYSIS_FILE)
 
-# Merge (sample tickets only if not already analyzed)
-existing_subjects = {t["subject"] for t in analyzed_tickets}
-for t in sample_tickets:
+# Add sample tickets the store has not seen yet
+existing_subjects = {t["subject"] for t in copilot.list_tickets()}
+for t in load_json(SAMPLE_FILE):
     if t["subject"] not in existing_subjects:
-        t["id"] = get_next_ticket_id(analyzed_tickets)
-        analyzed_tickets.append(t)
+        copilot.create_ticket(t["subject"], t["body"], status=None, run_analysis=False)
+
+analyzed_tickets = copilot.list_tickets()
 
 # Initialize session state
-if "analyzed_tickets" not in st.session_state:
-    st.session_state.analyzed_tickets = analyzed_tickets
 if "new_ticket_submitted" not in st.session_state:
     st.session_state.new_ticket_submitted = False
 if "current_ticket_id" not in st.session_state:
@@ -193,7 +202,7 @@ if "current_ticket_id" not in st.session_state:
 
 # NAVIGATION
 st.sidebar.title("📌 Navigation")
-page = st.sidebar.radio("Go to:", ["📋 Ticket Dashboard", "➕ Add a Ticket"])
+page = st.sidebar.radio("Go to:", ["📋 Ticket Dashboard", "➕ Add a Ticket", "📈 Pipeline Metrics"])
 
 st.title("Customer Support Copilot")
 
@@ -201,18 +210,19 @@ st.title("Customer Support Copilot")
 # Ticket Dashboard
 if page == "📋 Ticket Dashboard":
     st.subheader("Ticket Dashboard")
+    render_queue()
+
+    # Analyze the whole backlog up front in batches, saving once
+    pending = [t for t in analyzed_tickets if "analysis" not in t]
+    if pending:
+        with st.spinner(f"Analyzing {len(pending)} tickets..."):
+            copilot.analyze_pending()
+            analyzed_tickets = copilot.list_tickets()
 
     for i, t in enumerate(analyzed_tickets, 1):
         st.markdown(f"### {t['id']}: {t['subject']}")
         st.write(t["body"])
 
-        # Ensure analysis exists
-        if "analysis" not in t:
-            with st.spinner("Analyzing..."):
-                t["analysis"] = run_analysis(t)
-                t.setdefault("status", "Open")
-                save_json(ANALYSIS_FILE, analyzed_tickets)
-
         analysis = t.get("analysis", {})
 
         # Tags, Sentiment, Priority
@@ -237,7 +247,7 @@ if page == "📋 Ticket Dashboard":
         if st.session_state[show_key]:
             ticket_status = t.get("status")
 
-            if ticket_status in ["Open", "Answered"]:
+            if ticket_status in [None, "Open", "Answered", "Pending"]:
                 # Let handle_ticket_answer handle both RAG + feedback
                 handle_ticket_answer(t["id"])
 
@@ -264,22 +274,11 @@ elif page == "➕ Add a Ticket":
             if not subj or not body:
                 st.warning("Please provide both subject and body.")
             else:
-                ticket_id = get_next_ticket_id(st.session_state.analyzed_tickets)
-                new_ticket = {
-                    "id": ticket_id,
-                    "subject": subj,
-                    "body": body,
-                    "status": "Open",
-                }
-
-                # Run analysis
+                # Create + analyze the ticket
                 with st.spinner("Analyzing ticket..."):
-                    new_ticket["analysis"] = run_analysis(new_ticket)
+                    new_ticket = copilot.create_ticket(subj, body)
+                ticket_id = new_ticket["id"]
 
-                # Save ticket in session + JSON
-                st.session_state.analyzed_tickets.append(new_ticket)
-                save_json(ANALYSIS_FILE, st.session_state.analyzed_tickets)
-                
                 # Set state to show the analysis and feedback
                 st.session_state.new_ticket_submitted = True
                 st.session_state.current_ticket_id = ticket_id
@@ -288,7 +287,7 @@ elif page == "➕ Add a Ticket":
     else:
         # Show analysis and feedback for the newly submitted ticket
         ticket_id = st.session_state.current_ticket_id
-        ticket = next((t for t in st.session_state.analyzed_tickets if t["id"] == ticket_id), None)
+        ticket = copilot.get_ticket(ticket_id)
         
         if ticket:
             # Display analysis
@@ -308,4 +307,10 @@ elif page == "➕ Add a Ticket":
                 st.rerun()
         else:
             st.error("Ticket not found!")
-            st.session_state.new_ticket_submitted = False
\ No newline at end of file
+            st.session_state.new_ticket_submitted = False
+
+
+# Pipeline Metrics (admin)
+elif page == "📈 Pipeline Metrics":
+    st.subheader("Pipeline Metrics")
+    render_metrics()
@@ -0,0 +1,99 @@
+"""
+Recall@k vs latency of the FAISS index types (flat / IVF-PQ / HNSW) over a collection's
+vectors. Ground truth is exact search on a flat index; queries are the sample tickets
+(or stored vectors with noise when --synthetic is set, no model needed).
+
+    python -m benchmarks.bench_index --collection documentation
+    python -m benchmarks.bench_index --synthetic 200000
+"""
+import argparse
+import json
+from time import perf_counter
+
+import faiss
+import numpy as np
+
+from rag_system.config import INDEX_DEFAULTS
+from rag_system.index_store import apply_search_params, make_index
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def collection_vectors(collection_key):
+    from rag_system.vector_store import get_vectorstore
+
+    index = get_vectorstore(collection_key).index
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def ticket_queries(path):
+    from rag_system.vector_store import embedding_function
+
+    with open(path, "r", encoding="utf-8") as f:
+        tickets = json.load(f)
+    texts = [f"{t['subject']}\n{t['body']}" for t in tickets]
+    return np.asarray([embedding_function.embed_query(t) for t in texts], dtype=np.float32)
+
+
+def recall_at_k(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def run(index, queries, k, repeat):
+    # one query at a time, like the retriever
+    timings = []
+    for _ in range(repeat):
+        for q in queries:
+            start = perf_counter()
+            index.search(q[None, :], k)
+            timings.append(perf_counter() - start)
+    _, found = index.search(queries, k)
+    return found, np.percentile(timings, 50) * 1e3, np.percentile(timings, 95) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", default="documentation")
+    parser.add_argument("--tickets", default="tickets/sample_tickets.json")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of a collection")
+    parser.add_argument("--queries", type=int, default=200, help="synthetic queries")
+    parser.add_argument("--k", type=int, default=30, help="recall@k, the retriever's fetch_k")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = rng.standard_normal((args.synthetic, DIM)).astype(np.float32)
+        picks = rng.choice(len(vectors), args.queries, replace=False)
+        queries = vectors[picks] + 0.1 * rng.standard_normal((args.queries, DIM)).astype(np.float32)
+    else:
+        vectors = np.ascontiguousarray(collection_vectors(args.collection), dtype=np.float32)
+        queries = ticket_queries(args.tickets)
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{args.k}\n")
+
+    configs = [("flat", {})]
+    configs += [("ivfpq", {"nprobe": n}) for n in args.nprobe]
+    configs += [("hnsw", {"ef_search": ef}) for ef in args.ef_search]
+
+    truth, built = None, {}
+    print(f"{'index':>6} {'param':>14} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8} {'build s':>8}")
+    for kind, params in configs:
+        spec = {**INDEX_DEFAULTS, "type": kind, **params}
+        if kind not in built:
+            start = perf_counter()
+            index = make_index(vectors, spec)
+            built[kind] = (index, perf_counter() - start, faiss.serialize_index(index).nbytes / 2**20)
+        index, build_s, size_mb = built[kind]
+        apply_search_params(index, spec)
+
+        found, p50, p95 = run(index, queries, args.k, args.repeat)
+        if truth is None:
+            truth = found
+        param = ", ".join(f"{key}={value}" for key, value in params.items()) or "-"
+        print(f"{kind:>6} {param:>14} {recall_at_k(found, truth):>7.3f} {p50:>8.3f} {p95:>8.3f} {size_mb:>8.1f} {build_s:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
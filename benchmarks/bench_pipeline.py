@@ -0,0 +1,213 @@
+"""
+End-to-end pipeline benchmark with a deterministic stand-in for Gemini (benchmarks/fake_llm.py).
+Runs the sample tickets plus a synthetic ticket set through the same steps as
+rag_answer and reports per-stage latency percentiles (load, embed, classify, search,
+rerank, generate), throughput, peak RSS and recall@k against benchmarks/data/relevance.json.
+Results are written as JSON; pass --baseline to compare with an earlier run.
+
+    python -m benchmarks.bench_pipeline --synthetic 200
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/pipeline.json --output /tmp/new.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+from time import perf_counter, time
+
+import numpy as np
+
+from benchmarks.fake_llm import fake_factory
+from rag_system.answer_generator import answer_with_context
+from rag_system.config import COLLECTIONS, CONTEXT_TOKEN_BUDGET, FETCH_K, HYBRID_SEARCH, MMR_ALPHA, TOP_K
+from rag_system.context_packer import pack_context
+from rag_system.index_store import index_spec
+from rag_system.llm import set_model_factory
+from rag_system.mmr import mmr_rerank
+from rag_system.router import collection_centroids, route_query
+from rag_system.vector_store import (
+    collection_candidates,
+    embedding_function,
+    get_lexical_index,
+    get_vectorstore,
+    to_results,
+)
+
+STAGES = ("embed", "classify", "search", "rerank", "generate")
+
+
+def synthetic_tickets(tickets, n, seed=0):
+    """New tickets made by recombining sentences of the sample tickets (deterministic per seed)."""
+    rng = random.Random(seed)
+    sentences = [s.strip() for t in tickets for s in t["body"].split(". ") if s.strip()]
+    subjects = [t["subject"] for t in tickets]
+    return [
+        {
+            "id": f"SYN-{i}",
+            "subject": rng.choice(subjects),
+            "body": ". ".join(rng.sample(sentences, 3)),
+        }
+        for i in range(n)
+    ]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def percentiles(samples):
+    a = np.asarray(samples) * 1e3
+    return {
+        "count": len(a),
+        "mean_ms": float(a.mean()),
+        "p50_ms": float(np.percentile(a, 50)),
+        "p90_ms": float(np.percentile(a, 90)),
+        "p95_ms": float(np.percentile(a, 95)),
+        "p99_ms": float(np.percentile(a, 99)),
+    }
+
+
+def recall(urls, relevant):
+    return len(set(urls) & set(relevant)) / len(relevant)
+
+
+def load_stage():
+    """Cold-start cost of each component, in seconds."""
+    timings = {}
+    start = perf_counter()
+    embedding_function.load()
+    timings["embedding_model"] = perf_counter() - start
+    for key in COLLECTIONS:
+        start = perf_counter()
+        get_vectorstore(key)
+        if HYBRID_SEARCH:
+            get_lexical_index(key)
+        collection_centroids(key)
+        timings[key] = perf_counter() - start
+    return timings
+
+
+def answer_ticket(text, timings):
+    """rag_answer's steps, timed one by one (no answer cache). Returns (candidate urls, result urls)."""
+    start = perf_counter()
+    # the model itself, not the query cache, so repeated runs measure the same work
+    query_embedding = embedding_function.underlying.embed_query(text)
+    timings["embed"].append(perf_counter() - start)
+
+    start = perf_counter()
+    label = route_query(text, query_embedding)
+    timings["classify"].append(perf_counter() - start)
+
+    start = perf_counter()
+    _, docs, vectors = collection_candidates(label, text, query_embedding, FETCH_K)
+    timings["search"].append(perf_counter() - start)
+
+    start = perf_counter()
+    top_docs = mmr_rerank(query_embedding, vectors, docs, alpha=MMR_ALPHA, top_k=TOP_K)
+    results = to_results(top_docs, [label] * len(top_docs))
+    timings["rerank"].append(perf_counter() - start)
+
+    start = perf_counter()
+    context, _ = pack_context(results, CONTEXT_TOKEN_BUDGET)
+    answer_with_context(text, context)
+    timings["generate"].append(perf_counter() - start)
+
+    return [d.metadata.get("url") for d in docs], [r["url"] for r in results]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('commit')}):")
+    for stage in STAGES:
+        old, new = baseline["stages"].get(stage), report["stages"][stage]
+        if old:
+            change = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            print(f"  {stage:>9} p50 {old['p50_ms']:8.2f} -> {new['p50_ms']:8.2f} ms ({change:+.1f}%)")
+    for key in ("throughput_tps", "peak_rss_mb", "recall_at_k", "candidate_recall"):
+        print(f"  {key:>17} {baseline.get(key)} -> {report[key]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", default="tickets/sample_tickets.json")
+    parser.add_argument("--relevance", default="benchmarks/data/relevance.json")
+    parser.add_argument("--synthetic", type=int, default=200, help="synthetic tickets added to the sample set")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per LLM call")
+    parser.add_argument("--llm-ms-per-token", type=float, default=0.0, help="simulated latency per output token")
+    parser.add_argument("--output", default="benchmarks/results/pipeline.json")
+    parser.add_argument("--baseline", help="earlier JSON result to compare with")
+    args = parser.parse_args()
+
+    set_model_factory(fake_factory(args.llm_latency_ms / 1e3, args.llm_ms_per_token / 1e3))
+
+    with open(args.tickets, "r", encoding="utf-8") as f:
+        tickets = json.load(f)
+    with open(args.relevance, "r", encoding="utf-8") as f:
+        relevance = json.load(f)
+    tickets += synthetic_tickets(tickets, args.synthetic, args.seed)
+
+    load = load_stage()
+    timings = {stage: [] for stage in STAGES}
+    recalls, candidate_recalls = [], []
+
+    start = perf_counter()
+    for t in tickets:
+        candidate_urls, result_urls = answer_ticket(f"{t['subject']}\n{t['body']}", timings)
+        if t["id"] in relevance:
+            recalls.append(recall(result_urls, relevance[t["id"]]))
+            candidate_recalls.append(recall(candidate_urls, relevance[t["id"]]))
+    elapsed = perf_counter() - start
+
+    report = {
+        "timestamp": time(),
+        "commit": git_commit(),
+        "config": {
+            "top_k": TOP_K,
+            "fetch_k": FETCH_K,
+            "hybrid_search": HYBRID_SEARCH,
+            "context_token_budget": CONTEXT_TOKEN_BUDGET,
+            "index": {key: index_spec(key) for key in COLLECTIONS},
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_ms_per_token": args.llm_ms_per_token,
+        },
+        "tickets": len(tickets),
+        "load_s": load,
+        "stages": {stage: percentiles(samples) for stage, samples in timings.items()},
+        "throughput_tps": len(tickets) / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "labeled_tickets": len(recalls),
+        "recall_at_k": float(np.mean(recalls)) if recalls else None,
+        "candidate_recall": float(np.mean(candidate_recalls)) if candidate_recalls else None,
+    }
+
+    print(f"{len(tickets)} tickets, load: " + ", ".join(f"{k} {v:.2f}s" for k, v in load.items()))
+    print(f"{'stage':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:>9} {s['mean_ms']:>9.2f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    print(f"throughput {report['throughput_tps']:.1f} tickets/s, peak RSS {report['peak_rss_mb']:.0f} MB")
+    print(f"recall@{TOP_K} {report['recall_at_k']}, recall@{FETCH_K} (candidates) {report['candidate_recall']} over {len(recalls)} labeled tickets")
+
+    if args.baseline:
+        compare(report, args.baseline)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
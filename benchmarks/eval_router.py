@@ -0,0 +1,48 @@
+"""
+Offline accuracy check for the local query router against the labeled sample tickets.
+No LLM calls are made: for each margin threshold it reports how often the router
+would fall back to the LLM and how accurate the local decisions are.
+
+    python -m benchmarks.eval_router
+"""
+import argparse
+import json
+
+from rag_system.router import score_collections
+from rag_system.vector_store import embedding_function
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", default="tickets/sample_tickets.json")
+    parser.add_argument("--labels", default="benchmarks/data/router_labels.json")
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.02, 0.05, 0.1])
+    args = parser.parse_args()
+
+    with open(args.tickets, "r", encoding="utf-8") as f:
+        tickets = json.load(f)
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+
+    rows = []
+    for t in tickets:
+        if t["id"] not in labels:
+            continue
+        scores = score_collections(embedding_function.embed_query(t["subject"] + " " + t["body"]))
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        margin = ranked[0][1] - ranked[1][1]
+        rows.append((t["id"], ranked[0][0], labels[t["id"]], margin))
+        flag = "" if ranked[0][0] == labels[t["id"]] else "  <-- miss"
+        print(f"{t['id']}: predicted={ranked[0][0]:<13} expected={labels[t['id']]:<13} margin={margin:.3f}{flag}")
+
+    print(f"\n{'margin':>7} {'fallback':>9} {'local acc':>10}")
+    for threshold in args.margins:
+        local = [r for r in rows if r[3] >= threshold]
+        correct = sum(1 for r in local if r[1] == r[2])
+        fallback_rate = 1 - len(local) / len(rows)
+        accuracy = correct / len(local) if local else float("nan")
+        print(f"{threshold:>7.2f} {fallback_rate:>8.0%} {accuracy:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
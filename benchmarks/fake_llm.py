@@ -0,0 +1,60 @@
+"""
+Deterministic local stand-in for the Gemini models, installed with
+rag_system.llm.set_model_factory. The same prompt always gets the same answer after
+a fixed simulated latency, so runs are comparable and cost nothing.
+"""
+import asyncio
+import re
+import time
+
+# query terms that send the classifier stand-in to the developer KB
+DEVELOPER_TERMS = ("api", "sdk", "python", "java", "rest", "code", "programmatic", "token", "endpoint", "error")
+
+_query = re.compile(r"Query:\s*(.*)")
+_source = re.compile(r"Source:\s*(\S+)")
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, model_name, generation_config=None, latency_s=0.0, per_token_s=0.0):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.latency_s = latency_s
+        self.per_token_s = per_token_s
+        self.calls = 0
+
+    def respond(self, prompt):
+        match = _query.search(prompt)
+        query = match.group(1).lower() if match else ""
+        if "Answer with one word" in prompt:
+            return "developer" if any(term in query for term in DEVELOPER_TERMS) else "documentation"
+        # answer prompt: a fixed body plus every cited source, roughly answer-sized
+        sources = list(dict.fromkeys(_source.findall(prompt)))
+        body = " ".join(["Here is how to resolve this."] * 20)
+        return body + "\n\nCitations:\n" + "\n".join(f"- {url}" for url in sources)
+
+    def delay(self, text):
+        return self.latency_s + self.per_token_s * (len(text) // 4)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        text = self.respond(prompt)
+        time.sleep(self.delay(text))
+        if stream:
+            return [FakeResponse(text[i : i + 40]) for i in range(0, len(text), 40)]
+        return FakeResponse(text)
+
+    async def generate_content_async(self, prompt, request_options=None):
+        self.calls += 1
+        text = self.respond(prompt)
+        await asyncio.sleep(self.delay(text))
+        return FakeResponse(text)
+
+
+def fake_factory(latency_s=0.0, per_token_s=0.0):
+    """Model factory for set_model_factory."""
+    return lambda model_name, generation_config: FakeModel(model_name, generation_config, latency_s, per_token_s)
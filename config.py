@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# ticket topics the RAG pipeline answers; everything else is routed to a team
+RAG_TOPICS = ["How-to", "Product", "Best practices", "API/SDK", "SSO"]
+
 def get_classification_key():
     """Return API key for classification pipeline"""
     try:
@@ -12,3 +15,12 @@ def get_classification_key():
         return st.secrets["GEMINI_API_KEY"]
     except Exception:
         return os.getenv("GEMINI_API_KEY")
+
+
+def get_api_url():
+    """Return the copilot API url (empty: run the pipeline inside the Streamlit app)"""
+    try:
+        import streamlit as st
+        return st.secrets["COPILOT_API_URL"]
+    except Exception:
+        return os.getenv("COPILOT_API_URL")
@@ -0,0 +1,96 @@
+import requests
+
+
+class CopilotClient:
+    """HTTP client for api.py with the same methods as copilot_service.CopilotService."""
+
+    def __init__(self, base_url, timeout=120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # pooled connection reused across Streamlit reruns
+        self.session = requests.Session()
+
+    def _request(self, method, path, **kwargs):
+        resp = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    def warmup(self):
+        self._request("GET", "/health")
+
+    def analyze(self, text):
+        return self._request("POST", "/analyze", json={"text": text}).json()
+
+    def analyze_batch(self, texts):
+        return self._request("POST", "/analyze/batch", json={"texts": texts}).json()["results"]
+
+    def analyze_pending(self):
+        return self._request("POST", "/tickets/analyze").json()["analyzed"]
+
+    def answer(self, query, label=None):
+        return self._request("POST", "/answer", json={"query": query, "label": label}).json()["answer"]
+
+    def answer_stream(self, query, label=None):
+        resp = self._request("POST", "/answer/stream", json={"query": query, "label": label}, stream=True)
+        resp.encoding = "utf-8"
+        for text in resp.iter_content(chunk_size=None, decode_unicode=True):
+            if text:
+                yield text
+
+    def metrics_text(self):
+        return self._request("GET", "/metrics").text
+
+    def telemetry(self, limit=20):
+        return self._request("GET", "/traces", params={"limit": limit}).json()
+
+    def list_tickets(self, status=None, priority=None):
+        params = {k: v for k, v in {"status": status, "priority": priority}.items() if v is not None}
+        return self._request("GET", "/tickets", params=params).json()
+
+    def get_ticket(self, ticket_id):
+        resp = self.session.get(f"{self.base_url}/tickets/{ticket_id}", timeout=self.timeout)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+
+    def create_ticket(self, subject, body, status="Open", run_analysis=True):
+        payload = {"subject": subject, "body": body, "status": status, "analyze": run_analysis}
+        return self._request("POST", "/tickets", json=payload).json()
+
+    def update_ticket(self, ticket_id, **fields):
+        return self._request("PATCH", f"/tickets/{ticket_id}", json=fields).json()
+
+    # answer jobs run by the API's workers
+    def enqueue_answer(self, ticket_id, retry=False):
+        resp = self.session.post(f"{self.base_url}/tickets/{ticket_id}/answer", params={"retry": retry}, timeout=self.timeout)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_job(self, ticket_id):
+        resp = self.session.get(f"{self.base_url}/tickets/{ticket_id}/job", timeout=self.timeout)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+
+    def job_counts(self):
+        return self._request("GET", "/jobs").json()
+
+
+def get_client(api_url=None):
+    """
+    HTTP client when an API url is configured (COPILOT_API_URL), otherwise an
+    in-process CopilotService so the app still runs standalone, with its own
+    answer workers.
+    """
+    if api_url:
+        return CopilotClient(api_url)
+
+    from copilot_service import CopilotService
+
+    service = CopilotService()
+    service.start_workers()
+    return service
@@ -0,0 +1,206 @@
+import os
+import time
+from pathlib import Path
+
+import model
+from config import RAG_TOPICS
+from job_queue import JobQueue, JobWorkers, priority_rank
+from model import analyze, analyze_batch
+from rag_system import process_tickets, rag_answer, rag_answer_stream, warmup
+from rag_system.router import router_stats
+from rag_system.telemetry import counters, prometheus_text, recent_traces, stage_summary
+from ticket_store import TicketStore
+
+# File paths
+ANALYSIS_DIR = Path("analysis")
+ANALYSIS_FILE = ANALYSIS_DIR / "analysis_tickets.json"
+LAST_ID_FILE = ANALYSIS_DIR / "last_id.txt"
+TICKETS_DB = ANALYSIS_DIR / "tickets.db"
+
+# background answering: worker threads, and how long a running job may go without
+# finishing before it is considered abandoned (its process died) and queued again
+ANSWER_WORKERS = int(os.getenv("COPILOT_ANSWER_WORKERS", "2"))
+JOB_LEASE_S = 600
+# how often a running job stores the answer streamed so far (s)
+PROGRESS_EVERY_S = 0.25
+
+
+def analysis_to_dict(raw):
+    return {
+        "tags": raw.topic_tags,
+        "sentiment": raw.sentiment,
+        "priority": raw.priority,
+        "route": raw.route,
+    }
+
+
+def ticket_text(ticket):
+    return ticket.get("subject", "") + " " + ticket.get("body", "")
+
+
+def job_priority(ticket):
+    return priority_rank((ticket.get("analysis") or {}).get("priority"))
+
+
+class CopilotService:
+    """
+    Copilot operations on top of model.analyze, rag_system and the ticket store.
+    One instance is shared by every request of the HTTP API (or by the Streamlit
+    app when it runs without the API), so the embedding model, retrievers and
+    answer cache stay warm.
+    """
+
+    def __init__(self, db_path=TICKETS_DB):
+        ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+        self.store = TicketStore(db_path)
+        # one-time import of the tickets kept in JSON before the SQLite store
+        self.store.migrate_from_json(ANALYSIS_FILE, LAST_ID_FILE)
+        self.jobs = JobQueue(db_path)
+        self.workers = None
+
+    def warmup(self):
+        model.warmup()
+        warmup()
+
+    # analysis
+    def analyze(self, text):
+        raw = analyze(text)
+        return analysis_to_dict(raw) if raw is not None else None
+
+    def analyze_batch(self, texts):
+        return [analysis_to_dict(raw) if raw is not None else None for raw in analyze_batch(texts)]
+
+    def analyze_pending(self):
+        """Analyzes every ticket without analysis in packed batches; one transaction for the results."""
+        pending = [t for t in self.store.list() if "analysis" not in t]
+        if not pending:
+            return 0
+        updates = []
+        for t, analysis in zip(pending, self.analyze_batch([ticket_text(t) for t in pending])):
+            if analysis is not None:
+                updates.append((t["id"], {"analysis": analysis, "status": t.get("status", "Open")}))
+        self.store.update_many(updates)
+        # answer the newly analyzed open tickets in the background
+        self.enqueue_many(
+            [(ticket_id, job_priority(fields)) for ticket_id, fields in updates if fields["status"] == "Open"]
+        )
+        return len(updates)
+
+    # answers
+    def answer(self, query, label=None):
+        return rag_answer(query, label=label)
+
+    def answer_stream(self, query, label=None):
+        return rag_answer_stream(query, label=label)
+
+    async def answer_batch(self, items):
+        """items: [(query, label), ...]; answered concurrently by the async pipeline."""
+        return await process_tickets(items)
+
+    def stream_answer(self, query, label=None, progress=None):
+        """The full answer of answer_stream, handing the text so far to progress(text) as it grows."""
+        parts, last = [], 0.0
+        for text in self.answer_stream(query, label=label):
+            parts.append(text)
+            if progress is not None and time.monotonic() - last >= PROGRESS_EVERY_S:
+                progress("".join(parts))
+                last = time.monotonic()
+        return "".join(parts).strip()
+
+    def answer_ticket(self, ticket_id, progress=None):
+        """
+        Answers one ticket and stores the result: a RAG answer for supported topics
+        (Answered, or Pending when the knowledge base has nothing), otherwise the ticket
+        is routed to a team (Rerouted). Run by the job workers, which pass progress to
+        show the answer while it streams.
+        """
+        ticket = self.store.get(ticket_id)
+        if ticket is None or ticket.get("status") not in (None, "Open", "Pending"):
+            return
+
+        fields = {}
+        analysis = ticket.get("analysis")
+        if analysis is None:
+            analysis = self.analyze(ticket_text(ticket))
+            if analysis is None:
+                raise RuntimeError("ticket analysis failed")
+            fields["analysis"] = analysis
+
+        tags = analysis.get("tags", [])
+        if any(tag in RAG_TOPICS for tag in tags):
+            try:
+                answer = self.stream_answer(ticket_text(ticket), analysis.get("route"), progress) or None
+            except Exception:
+                self.store.update(ticket_id, status="Pending", **fields)
+                raise
+            fields.update(answer=answer, status="Answered" if answer else "Pending")
+        else:
+            fields.update(answer=f"Ticket classified as '{', '.join(tags)}'; routed to appropriate team", status="Rerouted")
+        self.store.update(ticket_id, **fields)
+
+    # background answer jobs
+    def start_workers(self, workers=ANSWER_WORKERS):
+        """Starts the answer workers and queues every open ticket that has no answer yet."""
+        if self.workers is None:
+            self.workers = JobWorkers(self.jobs, self.answer_ticket, workers=workers, lease_s=JOB_LEASE_S)
+        self.workers.start()
+        self.enqueue_many([(t["id"], job_priority(t)) for t in self.store.list(status="Open") if not t.get("answer")])
+
+    def stop_workers(self):
+        if self.workers is not None:
+            self.workers.stop()
+
+    def enqueue_many(self, items, retry=False):
+        queued = self.jobs.enqueue_many(items, retry=retry)
+        if queued and self.workers is not None:
+            self.workers.notify()
+        return queued
+
+    def enqueue_answer(self, ticket_id, retry=False):
+        """Queues a ticket for answering (once per ticket; retry=True re-runs a finished or failed job)."""
+        ticket = self.store.get(ticket_id)
+        if ticket is None:
+            return None
+        self.enqueue_many([(ticket_id, job_priority(ticket))], retry=retry)
+        return self.jobs.get(ticket_id)
+
+    def get_job(self, ticket_id):
+        return self.jobs.get(ticket_id)
+
+    def job_counts(self):
+        return self.jobs.counts()
+
+    # telemetry
+    def metrics_text(self):
+        return prometheus_text()
+
+    def telemetry(self, limit=20):
+        """Per-stage latency summary, counters, router decisions and the most recent traces."""
+        return {
+            "stages": stage_summary(),
+            "counters": counters(),
+            "router": router_stats(),
+            "traces": recent_traces(limit),
+        }
+
+    # tickets
+    def list_tickets(self, status=None, priority=None):
+        return self.store.list(status=status, priority=priority)
+
+    def get_ticket(self, ticket_id):
+        return self.store.get(ticket_id)
+
+    def create_ticket(self, subject, body, status="Open", run_analysis=True):
+        ticket = {"id": self.store.next_id(), "subject": subject, "body": body, "status": status}
+        if run_analysis:
+            analysis = self.analyze(ticket_text(ticket))
+            if analysis is not None:
+                ticket["analysis"] = analysis
+        self.store.add(ticket)
+        if status == "Open":
+            self.enqueue_answer(ticket["id"])
+        return ticket
+
+    def update_ticket(self, ticket_id, **fields):
+        self.store.update(ticket_id, **fields)
+        return self.store.get(ticket_id)
@@ -0,0 +1,269 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from ticket_store import priority_token
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    ticket_id    TEXT PRIMARY KEY,
+    priority     INTEGER NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    worker       TEXT,
+    partial      TEXT,
+    enqueued_at  REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_next ON jobs(status, priority, enqueued_at);
+"""
+
+# job states
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# queue rank of the analysis priority ("P0 (High)", ...): P0 first, unknown / missing last
+PRIORITY_ORDER = {"P0": 0, "P1": 1, "P2": 2}
+
+
+def priority_rank(priority):
+    """Rank of a priority label such as "P0 (High)" or "P0"; lower is answered first."""
+    return PRIORITY_ORDER.get(priority_token(priority), len(PRIORITY_ORDER))
+
+
+def _row_to_job(row):
+    return dict(row) if row else None
+
+
+def worker_name(i):
+    return f"answer-worker-{os.getpid()}-{i}"
+
+
+def _worker_gone(worker):
+    """True when the worker's process no longer exists (POSIX; elsewhere only the lease applies)."""
+    match = re.search(r"-(\d+)-\d+$", worker or "")
+    if os.name != "posix" or match is None:
+        return False
+    try:
+        os.kill(int(match.group(1)), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class JobQueue:
+    """
+    Persistent answer queue in SQLite (WAL), one job per ticket id: enqueueing a ticket
+    that is already queued or running does nothing. Jobs are claimed lowest priority
+    value first (0 = P0), oldest first within a priority, and survive restarts.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        # queues created before answers were streamed; checked under the write lock,
+        # another process may be adding the column too
+        conn.execute("BEGIN IMMEDIATE")
+        if "partial" not in {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN partial TEXT")
+        conn.commit()
+
+    def _conn(self):
+        # one connection per thread, like TicketStore
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue_many(self, items, retry=False):
+        """
+        items: [(ticket_id, priority), ...] in one transaction. A queued job keeps its
+        place but takes the higher priority; finished / failed jobs are only queued
+        again with retry=True. Returns the ids that were (re)queued.
+        """
+        conn = self._conn()
+        queued = []
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for ticket_id, priority in items:
+                row = conn.execute("SELECT status, priority FROM jobs WHERE ticket_id = ?", (ticket_id,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO jobs (ticket_id, priority, status, enqueued_at) VALUES (?, ?, ?, ?)",
+                        (ticket_id, priority, QUEUED, now),
+                    )
+                    queued.append(ticket_id)
+                elif row["status"] == QUEUED:
+                    if priority < row["priority"]:
+                        conn.execute("UPDATE jobs SET priority = ? WHERE ticket_id = ?", (priority, ticket_id))
+                elif row["status"] in (DONE, FAILED) and retry:
+                    conn.execute(
+                        """
+                        UPDATE jobs SET status = ?, priority = ?, error = NULL, worker = NULL,
+                            enqueued_at = ?, started_at = NULL, finished_at = NULL
+                        WHERE ticket_id = ?
+                        """,
+                        (QUEUED, priority, now, ticket_id),
+                    )
+                    queued.append(ticket_id)
+        return queued
+
+    def enqueue(self, ticket_id, priority, retry=False):
+        self.enqueue_many([(ticket_id, priority)], retry=retry)
+        return self.get(ticket_id)
+
+    def claim(self, worker):
+        """Marks the next queued job as running for `worker` and returns it (None when idle)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT ticket_id FROM jobs WHERE status = ? ORDER BY priority, enqueued_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, worker = ?, started_at = ?, partial = NULL, attempts = attempts + 1
+                WHERE ticket_id = ?
+                """,
+                (RUNNING, worker, time.time(), row["ticket_id"]),
+            )
+        return self.get(row["ticket_id"])
+
+    def progress(self, ticket_id, worker, text):
+        """Stores the answer generated so far by `worker`'s run, for the dashboard to show."""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET partial = ? WHERE ticket_id = ? AND status = ? AND worker = ?",
+                (text, ticket_id, RUNNING, worker),
+            )
+
+    def finish(self, ticket_id, worker, error=None):
+        """
+        Records the outcome of `worker`'s run. Returns False when the job was requeued
+        (and maybe claimed again) meanwhile; its current run is then left alone.
+        """
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?, partial = NULL
+                WHERE ticket_id = ? AND status = ? AND worker = ?
+                """,
+                (FAILED if error else DONE, error, time.time(), ticket_id, RUNNING, worker),
+            )
+        return cur.rowcount > 0
+
+    def requeue_stale(self, lease_s):
+        """
+        Puts running jobs back in the queue when their worker's process is gone or they
+        started more than lease_s ago. Returns how many.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT ticket_id, worker, started_at FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            expired = time.time() - lease_s
+            stale = [(r["ticket_id"], r["worker"]) for r in rows if r["started_at"] < expired or _worker_gone(r["worker"])]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE ticket_id = ? AND status = ? AND worker IS ?",
+                [(QUEUED, ticket_id, RUNNING, worker) for ticket_id, worker in stale],
+            )
+        return len(stale)
+
+    def get(self, ticket_id):
+        return _row_to_job(self._conn().execute("SELECT * FROM jobs WHERE ticket_id = ?", (ticket_id,)).fetchone())
+
+    def counts(self):
+        """Number of jobs per status."""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: n for status, n in rows}
+
+
+class JobWorkers:
+    """
+    Worker threads that claim jobs and run handler(ticket_id, progress); the handler may
+    call progress(text) with the answer so far while it runs. A failing handler marks
+    the job failed with the error; it is not retried until enqueued again with retry=True.
+    Jobs abandoned by a dead process are requeued at start and then every check_s.
+    """
+
+    def __init__(self, queue, handler, workers=2, poll_s=1.0, lease_s=600, check_s=30):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_s = poll_s
+        self.lease_s = lease_s
+        self.check_s = check_s
+        self._next_check = 0.0
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._requeue_stale()
+        for i in range(self.workers):
+            name = worker_name(i)
+            t = threading.Thread(target=self._run, args=(name,), name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self):
+        """Wakes idle workers right away instead of at their next poll."""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _requeue_stale(self):
+        # one worker does the check per interval
+        with self._check_lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_s
+        requeued = self.queue.requeue_stale(self.lease_s)
+        if requeued:
+            print(f"Requeued {requeued} abandoned answer jobs")
+
+    def _run(self, name):
+        while not self._stop.is_set():
+            self._requeue_stale()
+            job = self.queue.claim(name)
+            if job is None:
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+            ticket_id = job["ticket_id"]
+            try:
+                self.handler(ticket_id, partial(self.queue.progress, ticket_id, name))
+            except Exception as e:
+                print(f"Answer job for {ticket_id} failed: {e}")
+                self.queue.finish(ticket_id, name, error=f"{type(e).__name__}: {e}")
+            else:
+                self.queue.finish(ticket_id, name)
@@ -1,61 +1,161 @@
-import json
-import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List
 
-import google.generativeai as genai
-import streamlit as st
 from pydantic import BaseModel, ValidationError
 
 from config import get_classification_key
+from rag_system.llm import generate, generate_async, get_model
+from rag_system.telemetry import bind, incr, span
 
+ANALYSIS_MODEL = "gemini-2.0-flash-lite"
 
-def init_gemini():
-    api_key = get_classification_key()
-    genai.configure(api_key=api_key)
 
-def analyze(ticket_text):
-    init_gemini()
-    # creating a class using pydantic basemodel
-    class TicketAnalysis(BaseModel):
-        topic_tags: List[str]
-        sentiment: str
-        priority: str
+# structured output of the ticket analysis call (also used as Gemini's response schema)
+class TicketAnalysis(BaseModel):
+    topic_tags: List[str]
+    sentiment: str
+    priority: str
+    # knowledge base to search when answering: developer / documentation
+    route: str
+
+
+# one entry of a batched analysis, tied back to its ticket by position
+class IndexedTicketAnalysis(TicketAnalysis):
+    ticket_index: int
+
+
+class TicketAnalysisBatch(BaseModel):
+    results: List[IndexedTicketAnalysis]
+
+
+# batch mode: tickets packed into one request, and requests in flight at once
+TICKETS_PER_REQUEST = 8
+MAX_CONCURRENT_REQUESTS = 4
 
+
+@lru_cache(maxsize=None)
+def prompt_template():
+    # read once per process
     with open("prompt.txt", "r", encoding="utf-8") as f:
-        prompt_template = f.read().strip()
+        return f.read().strip()
 
-    full_prompt = prompt_template.replace("{INSERT_TICKET_HERE}", ticket_text)
 
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
-    response = model.generate_content(full_prompt)
-    llm_output = response.text.strip()
-    print("Raw LLM output:\n", llm_output)
+def _normalize_route(analysis):
+    # same normalisation as rag_system.query_classifier
+    analysis.route = "developer" if "dev" in analysis.route.lower() else "documentation"
+    return analysis
 
-    # try extracting the json output
-    json_match = re.search(r'\{.*\}', llm_output, re.DOTALL)
-    if json_match:
-        json_str = json_match.group(0)
-        try:
-            data = json.loads(json_str)
-            ticket_analysis = TicketAnalysis(**data)
-            return ticket_analysis
 
-        except (json.JSONDecodeError, ValidationError) as e:
-            print("\nError parsing JSON:", e)
-            return
-    else:
-        # Fallback: parse human-readable format
-        topic_tags = re.findall(r"\*\*Topic Tags\*\*:\s*(.+)", llm_output)
-        sentiment = re.findall(r"\*\*Sentiment\*\*:\s*(.+)", llm_output)
-        priority = re.findall(r"\*\*Priority\*\*:\s*(.+)", llm_output)
+def _json_config(schema):
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def _generate_json(schema, prompt):
+    # the model object is memoized per schema, so no per-ticket setup
+    return generate(ANALYSIS_MODEL, get_classification_key(), prompt, generation_config=_json_config(schema))
+
+
+def _analysis_prompt(ticket_text):
+    return prompt_template().replace("{INSERT_TICKET_HERE}", ticket_text)
+
 
-        ticket_analysis = TicketAnalysis(
-            topic_tags=[tag.strip() for tag in topic_tags[0].split(",")] if topic_tags else [],
-            sentiment=sentiment[0].strip() if sentiment else "",
-            priority=priority[0].strip() if priority else ""
-        )
-        return ticket_analysis
+def _parse_analysis(text):
+    try:
+        ticket_analysis = TicketAnalysis.model_validate_json(text)
+    except ValidationError as e:
+        print("\nError parsing JSON:", e)
+        incr("analysis_parse_errors", kind="single")
+        return
+    return _normalize_route(ticket_analysis)
 
 
+def warmup():
+    """Reads the prompt and creates the model objects ahead of the first ticket."""
+    prompt_template()
+    for schema in (TicketAnalysis, TicketAnalysisBatch):
+        get_model(ANALYSIS_MODEL, get_classification_key(), _json_config(schema))
 
 
+def analyze(ticket_text):
+    """Tags, sentiment, priority and retrieval route for a ticket in one JSON-mode Gemini call."""
+    with span("analyze", model=ANALYSIS_MODEL) as s:
+        response = _generate_json(TicketAnalysis, _analysis_prompt(ticket_text))
+        analysis = _parse_analysis(response.text)
+        s.set(parsed=analysis is not None)
+    return analysis
+
+
+async def analyze_async(ticket_text):
+    """Non-blocking analyze(); shares the async pipeline's limit on concurrent LLM calls."""
+    from rag_system.async_pipeline import llm_semaphore
+
+    async with llm_semaphore():
+        with span("analyze", model=ANALYSIS_MODEL):
+            response = await generate_async(
+                ANALYSIS_MODEL,
+                get_classification_key(),
+                _analysis_prompt(ticket_text),
+                generation_config=_json_config(TicketAnalysis),
+            )
+    return _parse_analysis(response.text)
+
+
+def _analyze_packed(ticket_texts):
+    """Analyzes several tickets in a single request. Returns {position: TicketAnalysis}."""
+    # keep the labelling rules, replace the single-ticket output format
+    instructions = prompt_template().split("Return output strictly in JSON")[0].strip()
+    tickets = "\n".join(f'Ticket {i}: "{text}"' for i, text in enumerate(ticket_texts))
+    full_prompt = (
+        f"{instructions}\n\n"
+        "Analyze each of the following tickets independently. Return JSON with one entry in "
+        "\"results\" per ticket, with ticket_index set to the ticket's number.\n\n"
+        f"{tickets}"
+    )
+
+    with span("analyze_request", model=ANALYSIS_MODEL, tickets=len(ticket_texts)):
+        response = _generate_json(TicketAnalysisBatch, full_prompt)
+
+    try:
+        batch = TicketAnalysisBatch.model_validate_json(response.text)
+    except ValidationError as e:
+        print("\nError parsing batch JSON:", e)
+        incr("analysis_parse_errors", kind="batch")
+        return {}
+
+    results = {}
+    for item in batch.results:
+        if 0 <= item.ticket_index < len(ticket_texts):
+            fields = item.model_dump(exclude={"ticket_index"})
+            results[item.ticket_index] = _normalize_route(TicketAnalysis(**fields))
+    return results
+
+
+def analyze_batch(ticket_texts, per_request=TICKETS_PER_REQUEST, max_workers=MAX_CONCURRENT_REQUESTS):
+    """
+    Analyzes many tickets: packs per_request tickets into each call and keeps up to
+    max_workers calls in flight. Tickets missing from a batched response are retried
+    one by one. Returns a list aligned with ticket_texts (None where analysis failed).
+    """
+    groups = [list(range(i, min(i + per_request, len(ticket_texts)))) for i in range(0, len(ticket_texts), per_request)]
+    results = [None] * len(ticket_texts)
+
+    def run(group):
+        try:
+            packed = _analyze_packed([ticket_texts[i] for i in group])
+        except Exception as e:
+            print("Batch analysis failed:", e)
+            packed = {}
+        for pos, i in enumerate(group):
+            results[i] = packed.get(pos)
+            if results[i] is None:
+                incr("analysis_retries")
+                try:
+                    results[i] = analyze(ticket_texts[i])
+                except Exception as e:
+                    print(f"Analysis failed for ticket {i}:", e)
+
+    with span("analyze_batch", tickets=len(ticket_texts), requests=len(groups)):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(bind(run), groups))
+    return results
@@ -1,3 +1,22 @@
-from rag_system.pipeline import rag_answer
+# The entry points are imported on first use: `from rag_system import llm` (or any other
+# submodule) must not pull in FAISS, langchain and the answer cache.
+_EXPORTS = {
+    'process_tickets': 'rag_system.async_pipeline',
+    'rag_answer': 'rag_system.pipeline',
+    'rag_answer_async': 'rag_system.async_pipeline',
+    'rag_answer_stream': 'rag_system.pipeline',
+    'refresh_knowledge_base': 'rag_system.pipeline',
+    'warmup': 'rag_system.pipeline',
+}
 
-__all__ = ['rag_answer']
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'rag_system' has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
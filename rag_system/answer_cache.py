@@ -0,0 +1,144 @@
+import threading
+from time import time
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_system.config import COLLECTIONS
+from rag_system.vector_store import get_vectorstore, index_version
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32).reshape(1, -1)
+    return x / max(float(np.linalg.norm(x)), 1e-12)
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by the ticket embedding. A new ticket whose
+    cosine similarity to a cached one is at least `threshold` gets the cached answer.
+    Entries expire after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and an entry is dropped once any chunk it was built from has left
+    the knowledge base.
+    """
+
+    def __init__(self, threshold=0.92, ttl=24 * 3600, max_entries=1000, probe=4):
+        self.threshold = threshold
+        # nearest entries tried per lookup, in case the closest ones are stale
+        self.probe = probe
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index = None
+        self.entries = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entry_ids):
+        entry_ids = [i for i in entry_ids if i in self.entries]
+        if not entry_ids:
+            return
+        self.index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        for i in entry_ids:
+            del self.entries[i]
+
+    def _still_valid(self, entry):
+        # cheap path: nothing changed on disk since the answer was generated
+        for key, doc_ids in entry["chunks"].items():
+            version = index_version(COLLECTIONS[key]["name"])
+            if version == entry["versions"].get(key):
+                continue
+            docstore = get_vectorstore(key).docstore
+            if not all(isinstance(docstore.search(i), Document) for i in doc_ids):
+                return False
+            entry["versions"][key] = version
+        return True
+
+    def lookup(self, query_embedding):
+        """Returns the cached entry ({"answer", "citations", ...}) for a near-duplicate query, else None."""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            scores, ids = self.index.search(_normalize(query_embedding), min(self.probe, self.index.ntotal))
+            stale = []
+            found = None
+            # nearest first: the first valid entry above the threshold wins
+            for entry_id, score in zip(ids[0].tolist(), scores[0].tolist()):
+                if entry_id == -1 or score < self.threshold:
+                    break
+                entry = self.entries.get(entry_id)
+                if entry is None:
+                    continue
+                if time() - entry["created"] > self.ttl or not self._still_valid(entry):
+                    stale.append(entry_id)
+                    continue
+                found = entry
+                break
+            self._remove(stale)
+
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            found["hits"] += 1
+            found["last_used"] = time()
+            return found
+
+    def add(self, query_embedding, answer, docs):
+        """Caches an answer together with the chunks (docs from rag_search) it was generated from."""
+        vector = _normalize(query_embedding)
+        chunks = {}
+        for d in docs:
+            if d.get("doc_id") and d.get("collection") in COLLECTIONS:
+                chunks.setdefault(d["collection"], []).append(d["doc_id"])
+
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self.next_id
+            self.next_id += 1
+            now = time()
+            self.entries[entry_id] = {
+                "answer": answer,
+                "citations": list(dict.fromkeys(d["url"] for d in docs if d.get("url"))),
+                "chunks": chunks,
+                "versions": {key: index_version(COLLECTIONS[key]["name"]) for key in chunks},
+                "created": now,
+                "last_used": now,
+                "hits": 0,
+            }
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+
+            if len(self.entries) > self.max_entries:
+                by_age = sorted(self.entries, key=lambda i: self.entries[i]["last_used"])
+                self._remove(by_age[: len(self.entries) - self.max_entries])
+
+    def invalidate_chunks(self, chunk_ids):
+        """Drops every entry built from any of the given chunk ids (e.g. sync_index()['removed_ids'])."""
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            stale = [
+                i for i, e in self.entries.items()
+                if any(c in chunk_ids for ids in e["chunks"].values() for c in ids)
+            ]
+            self._remove(stale)
+
+    def clear(self):
+        with self._lock:
+            self.index = None
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,15 +1,14 @@
-import google.generativeai as genai
-
 from rag_system.config import get_rag_key
+from rag_system.context_packer import estimate_tokens
+from rag_system.llm import generate, generate_stream
+from rag_system.telemetry import span, start_span
 
-from .config import get_rag_key
+ANSWER_MODEL = "models/gemini-2.5-flash-lite-preview-06-17"
 
-# Configure Gemini
-genai.configure(api_key=get_rag_key())
 
-def answer_with_context(query, docs):
+def build_prompt(query, docs):
     context = "\n\n".join([f"Source: {d['url']}\nContent: {d['content']}" for d in docs])
-    prompt = f"""
+    return f"""
         You are a customer support assistant. Use the provided context to answer the user's query but dont mention about any context/documentation in the answer. NO greetings needed just provide the answer through context given. **ALWAYS and MUST** Include proper URLs for citations where relevant.
     
         Query: {query}
@@ -24,6 +23,66 @@ def answer_with_context(query, docs):
         - If not, politely say you don't have the answer and assure: "Your ticket is recorded and will be sent to the appropriate team."
     """
 
-    model = genai.GenerativeModel("models/gemini-2.5-flash-lite-preview-06-17")
-    resp = model.generate_content(prompt)
-    return resp.text.strip()
\ No newline at end of file
+
+def traced_prompt(query, docs, parent=None):
+    with span("prompt_build", parent=parent, chunks=len(docs)) as s:
+        prompt = build_prompt(query, docs)
+        s.set(prompt_tokens=estimate_tokens(prompt))
+    return prompt
+
+
+def record_usage(s, resp, text):
+    """Token counts reported by Gemini, estimated from the text otherwise."""
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is not None and getattr(usage, "candidates_token_count", None):
+        s.set(prompt_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count)
+    else:
+        s.set(output_tokens=estimate_tokens(text))
+
+
+def chunk_text(chunk):
+    """
+    Text of a streamed chunk. chunk.text raises ValueError when a chunk has no text
+    parts (a safety-blocked chunk, the final finish / usage-only chunk); those give "".
+    """
+    try:
+        return chunk.text or ""
+    except ValueError:
+        try:
+            return "".join(getattr(p, "text", "") for p in chunk.parts)
+        except ValueError:
+            return ""
+
+
+def answer_with_context(query, docs):
+    prompt = traced_prompt(query, docs)
+    with span("generate", model=ANSWER_MODEL) as s:
+        resp = generate(ANSWER_MODEL, get_rag_key(), prompt)
+        record_usage(s, resp, resp.text)
+    return resp.text.strip()
+
+
+def answer_with_context_stream(query, docs, parent=None):
+    """
+    Same as answer_with_context but yields the answer text as Gemini streams it.
+    parent: span of the calling request (generators cannot rely on the current span).
+    """
+    prompt = traced_prompt(query, docs, parent)
+    # ended by hand: a span made current here would outlive the generator's context
+    s = start_span("generate", parent=parent, model=ANSWER_MODEL, stream=True)
+    parts, chunk = [], None
+    try:
+        for chunk in generate_stream(ANSWER_MODEL, get_rag_key(), prompt):
+            text = chunk_text(chunk)
+            if not text:
+                continue
+            if not parts:
+                s.set(first_token_ms=round(s.elapsed() * 1e3, 3))
+            parts.append(text)
+            yield text
+        record_usage(s, chunk, "".join(parts))
+    except Exception as e:
+        s.end(error=e)
+        raise
+    finally:
+        s.end()
\ No newline at end of file
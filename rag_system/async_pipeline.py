@@ -0,0 +1,115 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from rag_system.answer_generator import ANSWER_MODEL, build_prompt
+from rag_system import llm
+from rag_system.config import (
+    CLASSIFY_HEDGE_AFTER,
+    COLLECTIONS,
+    LLM_CONCURRENCY,
+    LLM_HEDGE_AFTER,
+    PIPELINE_CONCURRENCY,
+    SEARCH_MODE,
+    get_rag_key,
+)
+from rag_system.pipeline import answer_cache, lookup_cached, pack
+from rag_system.query_classifier import CLASSIFY_MODEL, build_classify_prompt, parse_label
+from rag_system.router import route_locally
+from rag_system.telemetry import bind, span
+from rag_system.vector_store import embedding_function, rag_search, rag_search_all
+
+# embedding + FAISS work runs here so the event loop only waits on network I/O
+_cpu_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-cpu")
+
+# asyncio primitives belong to one event loop, keep one semaphore per loop
+# (weak keys: asyncio.run creates a new loop per call, closed loops drop out)
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def llm_semaphore():
+    """Bounds the number of concurrent LLM requests made from the running event loop."""
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return sem
+
+
+async def generate_async(model_name, prompt, hedge_after=LLM_HEDGE_AFTER):
+    async with llm_semaphore():
+        with span("generate", model=model_name):
+            resp = await llm.generate_async(model_name, get_rag_key(), prompt, hedge_after=hedge_after)
+    return resp.text.strip()
+
+
+async def _in_pool(fn, *args):
+    # run_in_executor does not carry the current span over to the worker thread
+    return await asyncio.get_running_loop().run_in_executor(_cpu_pool, bind(fn), *args)
+
+
+async def classify_query_async(query):
+    return parse_label(await generate_async(CLASSIFY_MODEL, build_classify_prompt(query), CLASSIFY_HEDGE_AFTER))
+
+
+async def answer_with_context_async(query, docs):
+    with span("prompt_build", chunks=len(docs)):
+        prompt = build_prompt(query, docs)
+    return await generate_async(ANSWER_MODEL, prompt)
+
+
+async def rag_answer_async(q, label=None):
+    """Async rag_answer: same cache / retrieval / packing, non-blocking Gemini calls."""
+    with span("rag_answer_async") as root:
+        query_embedding = await _in_pool(embedding_function.embed_query, q)
+        # the cache check may load collections from disk, keep it off the event loop
+        cached = await _in_pool(lookup_cached, query_embedding)
+        if cached is not None:
+            root.set(answer_cache="hit")
+            return cached["answer"]
+
+        if SEARCH_MODE == "fanout":
+            results = await _in_pool(rag_search_all, q)
+        else:
+            if label not in COLLECTIONS:
+                with span("classify") as s:
+                    label = await _in_pool(route_locally, query_embedding) or await classify_query_async(q)
+                    s.set(label=label)
+            results = await _in_pool(rag_search, q, label)
+
+        context, stats = pack(results)
+        gen_start = time()
+        final_answer = await answer_with_context_async(q, context)
+        stats["generate_s"] = time() - gen_start
+
+        await _in_pool(answer_cache.add, query_embedding, final_answer, results)
+        root.set(answer_cache="miss", label=label)
+        return final_answer
+
+
+async def process_tickets(tickets, concurrency=PIPELINE_CONCURRENCY):
+    """
+    Answers many tickets with up to `concurrency` in flight. Items are query strings
+    or (query, label) pairs; the iterable is consumed lazily. Returns answers in input
+    order, None for tickets that failed.
+    """
+    results = {}
+    items = enumerate(tickets)
+
+    async def worker():
+        for i, item in items:
+            query, label = item if isinstance(item, tuple) else (item, None)
+            try:
+                results[i] = await rag_answer_async(query, label)
+            except Exception as e:
+                print(f"Ticket {i} failed:", e)
+                results[i] = None
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return [results[i] for i in range(len(results))]
+
+
+def run_tickets(tickets, concurrency=PIPELINE_CONCURRENCY):
+    """Synchronous entry point for scripts: asyncio.run(process_tickets(...))."""
+    return asyncio.run(process_tickets(tickets, concurrency))
@@ -13,17 +13,94 @@ def get_rag_key():
         return os.getenv("GEMINI_KEY")
 
 
+# retrieval settings: results returned, candidates fetched for reranking, MMR relevance weight
+TOP_K = 4
+FETCH_K = 30
+MMR_ALPHA = 0.5
+
+# fuse BM25 (inverted index stored in faiss_store/<name>/lexical/) with vector search
+HYBRID_SEARCH = True
+
+# "route": search the one collection picked by the router
+# "fanout": search every collection in parallel and fuse the results (no routing step)
+SEARCH_MODE = "route"
+SEARCH_WORKERS = 8
+
+# local query router: below this centroid-score margin the LLM classifier is asked instead
+ROUTER_MARGIN = 0.05
+
+# max (estimated) tokens of retrieved context sent to the answer model
+CONTEXT_TOKEN_BUDGET = 1500
+
+# semantic answer cache: min cosine similarity for a hit, entry lifetime (s), max entries
+ANSWER_CACHE_THRESHOLD = 0.92
+ANSWER_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_SIZE = 1000
+
+# Gemini client (rag_system/llm.py): requests per second and burst per API key (tune to the key's quota),
+# timeout per attempt and deadline for all attempts (s), retries with jittered exponential backoff (s)
+LLM_RATE = 4.0
+LLM_BURST = 8
+LLM_TIMEOUT = 30.0
+LLM_DEADLINE = 60.0
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 8.0
+# send a duplicate request when the first has not answered after this many seconds (None = off);
+# on for the short classification call only, answers are too long to pay for twice
+LLM_HEDGE_AFTER = None
+CLASSIFY_HEDGE_AFTER = 2.0
+# circuit breaker: consecutive failures before failing fast, seconds before a probe call
+LLM_CIRCUIT_FAILURES = 5
+LLM_CIRCUIT_RESET = 30.0
+
+# async pipeline: LLM requests in flight at once, tickets processed concurrently
+LLM_CONCURRENCY = 8
+PIPELINE_CONCURRENCY = 32
+
+# telemetry: JSONL file receiving every finished trace (off when unset), traces kept in memory
+TELEMETRY_LOG = os.getenv("RAG_TELEMETRY_LOG")
+TRACE_BUFFER = 200
+
 # directory for FAISS store (embeddings + indices storing)
 PERSIST_DIR = "./faiss_store"
 
+# embedding model + on-disk embedding cache (documents and recent queries)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = os.path.join(PERSIST_DIR, "embedding_cache")
+QUERY_CACHE_SIZE = 5000
+
+# FAISS index settings, overridable per collection through its "index" entry
+# type: "flat" (exact), "ivfpq" (compressed, trained on the corpus) or "hnsw" (graph)
+# ivfpq: nlist inverted lists, pq_m sub-quantizers of pq_bits bits, nprobe lists searched per query
+# hnsw: hnsw_m links per node, ef_construction / ef_search candidate list sizes
+# compare recall vs latency with: python -m benchmarks.bench_index
+INDEX_DEFAULTS = {
+    "type": "flat",
+    "nlist": 256,
+    "pq_m": 16,
+    "pq_bits": 8,
+    "nprobe": 16,
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+}
+
+# chunk_size / chunk_overlap are in characters
 COLLECTIONS = {
     "developer": {
         "name": "atlan_developer",
-        "file": "knowledge_base/atlan_developer.json"
+        "file": "knowledge_base/atlan_developer.jsonl",
+        "chunk_size": 500,
+        "chunk_overlap": 50,
+        "index": {"type": "flat"},
     },
     "documentation": {
         "name": "atlan_documentation",
-        "file": "knowledge_base/atlan_documentation.json"
+        "file": "knowledge_base/atlan_documentation.jsonl",
+        "chunk_size": 500,
+        "chunk_overlap": 50,
+        "index": {"type": "flat"},
     },
 }
 
@@ -0,0 +1,80 @@
+import re
+
+_sentence_split = re.compile(r"(?<=[.!?])\s+")
+_word = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text, no tokenizer round trip needed
+    return max(1, len(text) // 4)
+
+
+def merge_chunks(docs):
+    """
+    Merges chunks from the same url whose character ranges overlap or touch.
+    Groups keep the rank of their best (earliest) chunk, so MMR order is preserved.
+    """
+    by_url = {}
+    for rank, d in enumerate(docs):
+        by_url.setdefault(d.get("url"), []).append((rank, d))
+
+    merged = []
+    for url, items in by_url.items():
+        with_offset = sorted((i for i in items if i[1].get("offset") is not None), key=lambda i: i[1]["offset"])
+        current = None
+        for rank, d in with_offset:
+            start, text = d["offset"], d["content"]
+            if current is not None and start <= current["end"]:
+                # overlapping / adjacent: append only the part not already covered
+                current["content"] += text[current["end"] - start:]
+                current["end"] = max(current["end"], start + len(text))
+                current["rank"] = min(current["rank"], rank)
+                continue
+            if current is not None:
+                merged.append(current)
+            current = {"url": url, "content": text, "offset": start, "end": start + len(text), "rank": rank}
+        if current is not None:
+            merged.append(current)
+
+        # chunks from older indices have no offsets, keep them as they are
+        for rank, d in items:
+            if d.get("offset") is None:
+                merged.append({"url": url, "content": d["content"], "offset": None, "rank": rank})
+
+    merged.sort(key=lambda m: m["rank"])
+    return merged
+
+
+def _near_duplicate(words, kept, threshold):
+    for other in kept:
+        overlap = len(words & other) / len(words | other)
+        if overlap >= threshold:
+            return True
+    return False
+
+
+def pack_context(docs, token_budget, dedupe_threshold=0.85):
+    """
+    Builds the generation context from ranked retrieval results:
+    merges overlapping chunks of the same page, drops sentences that repeat (or nearly
+    repeat) one already included, and stops once token_budget is filled.
+    Returns (packed docs with url/content, estimated token count).
+    """
+    packed, kept_words, total = [], [], 0
+    for group in merge_chunks(docs):
+        sentences = []
+        for sentence in _sentence_split.split(group["content"]):
+            words = set(_word.findall(sentence.lower()))
+            if not words or _near_duplicate(words, kept_words, dedupe_threshold):
+                continue
+            cost = estimate_tokens(sentence)
+            if total + cost > token_budget:
+                break
+            sentences.append(sentence)
+            kept_words.append(words)
+            total += cost
+        if sentences:
+            packed.append({"url": group["url"], "content": " ".join(sentences)})
+        if total >= token_budget:
+            break
+    return packed, total
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_system.telemetry import incr, span
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def cache_key(model_name, text):
+    """Content address of an embedding: hash of (model name, normalized text)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Advisory lock on `path` shared by every process using the store (exclusive on Windows)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding store: a float32 matrix read through np.memmap plus an
+    append-only index log (a header line, then one [key, row] line per vector).
+    New vectors are appended to both, so a write costs the new rows only. When
+    max_entries is exceeded, the least recently used rows are dropped in one pass
+    down to low_water * max_entries and the matrix and log are compacted.
+    Several processes can share a store: writes take a file lock, and every
+    access first catches up on lines (or a compaction) written by the others.
+    """
+
+    def __init__(self, folder, max_entries=None, low_water=0.9):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.low_water = low_water
+        self.vectors_path = os.path.join(folder, "vectors.f32")
+        self.log_path = os.path.join(folder, "index.log")
+        self.lock_path = os.path.join(folder, "lock")
+        self._lock = threading.Lock()
+        self._matrix = None
+        os.makedirs(folder, exist_ok=True)
+
+        self.dim = None
+        # key -> [row, last_used]
+        self.rows = {}
+        self.clock = 0
+        self._generation = None
+        self._log_offset = 0
+        self._log_stat = None
+        with self._lock, file_lock(self.lock_path):
+            self._migrate_json_index()
+            self._refresh()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _file_rows(self):
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _map(self, needed_rows):
+        # re-open the memmap only when rows were appended past the current view
+        if self._matrix is None or self._matrix.shape[0] < needed_rows:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self._file_rows(), self.dim)
+            )
+        return self._matrix
+
+    def _stat(self):
+        st = os.stat(self.log_path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Reads log lines appended since the last look; starts over after a compaction."""
+        if not os.path.exists(self.log_path):
+            return
+        stat = self._stat()
+        if stat == self._log_stat:
+            return
+        with open(self.log_path, "rb") as f:
+            header = json.loads(f.readline())
+            if header["generation"] != self._generation:
+                self._generation = header["generation"]
+                self.dim = header["dim"]
+                self.rows = {}
+                self._matrix = None
+                self._log_offset = f.tell()
+            f.seek(self._log_offset)
+            data = f.read()
+        # a line still being written by another process is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            key, row = json.loads(line)
+            self.clock += 1
+            self.rows[key] = [row, self.clock]
+        self._log_offset += end
+        self._log_stat = stat
+
+    def _write_log(self, entries):
+        """Replaces the log with a new generation holding [(key, row), ...], oldest first."""
+        self._generation = uuid.uuid4().hex
+        tmp = self.log_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"dim": self.dim, "generation": self._generation}) + "\n")
+            for key, row in entries:
+                f.write(json.dumps([key, row]) + "\n")
+        os.replace(tmp, self.log_path)
+        self._log_offset = os.path.getsize(self.log_path)
+        self._log_stat = self._stat()
+
+    def _migrate_json_index(self):
+        # stores written before the log kept a JSON index rewritten on every put
+        json_path = os.path.join(self.folder, "index.json")
+        if not os.path.exists(json_path) or os.path.exists(self.log_path):
+            return
+        with open(json_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        by_recency = sorted(meta["rows"].items(), key=lambda kv: kv[1][1])
+        self._write_log([(key, entry[0]) for key, entry in by_recency])
+        os.remove(json_path)
+        # let _refresh load the new log
+        self._generation = self._log_stat = None
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached."""
+        with self._lock:
+            with file_lock(self.lock_path, shared=True):
+                self._refresh()
+                found = {k: self.rows[k] for k in keys if k in self.rows}
+                if not found:
+                    return {}
+                matrix = self._map(max(entry[0] for entry in found.values()) + 1)
+                out = {k: np.array(matrix[entry[0]]) for k, entry in found.items()}
+            self.clock += 1
+            for entry in found.values():
+                entry[1] = self.clock
+            return out
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        with self._lock, file_lock(self.lock_path):
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_log([])
+            self._repair_tail()
+            start = self._file_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps([k, start + i]) + "\n" for i, k in enumerate(keys)))
+            self._log_offset = os.path.getsize(self.log_path)
+            self._log_stat = self._stat()
+
+            self.clock += 1
+            for i, k in enumerate(keys):
+                self.rows[k] = [start + i, self.clock]
+            if self.max_entries is not None and len(self.rows) > self.max_entries:
+                self._evict()
+
+    def _repair_tail(self):
+        """
+        Drops what a writer that died mid-append left behind (called under the exclusive
+        lock, so no live writer is appending): a partial last log line, and vector bytes
+        past the last row the log references, a torn row included. Otherwise the next
+        append would start at the wrong row or glue its first line onto the partial one.
+        """
+        if os.path.getsize(self.log_path) > self._log_offset:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(self._log_offset)
+            self._log_stat = self._stat()
+        if not os.path.exists(self.vectors_path):
+            return
+        referenced = max((entry[0] for entry in self.rows.values()), default=-1) + 1
+        size = min(self._file_rows(), referenced) * 4 * self.dim
+        if os.path.getsize(self.vectors_path) > size:
+            self._matrix = None
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(size)
+
+    def _evict(self):
+        # drop to the low-water mark at once so the next puts append again instead of compacting
+        target = int(self.max_entries * self.low_water)
+        keep = sorted(self.rows.items(), key=lambda kv: kv[1][1], reverse=True)[:target][::-1]
+        matrix = self._map(self._file_rows())
+        survivors = np.asarray(matrix[[entry[0] for _, entry in keep]], dtype=np.float32)
+        self._matrix = None
+        tmp = self.vectors_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(survivors.tobytes())
+        os.replace(tmp, self.vectors_path)
+        self.rows = {k: [i, entry[1]] for i, (k, entry) in enumerate(keep)}
+        self._write_log([(k, i) for i, (k, _) in enumerate(keep)])
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent content-addressed cache.
+    Documents (index builds) only embed texts that were never seen before;
+    queries go through an in-memory LRU backed by a size-capped disk store.
+    The model itself comes from `load_model` and is only loaded on the first
+    cache miss (or an explicit load()).
+    """
+
+    def __init__(self, load_model, model_name, cache_dir, query_cache_size=5000):
+        self._load_model = load_model
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.model_name = model_name
+        folder = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.documents = EmbeddingStore(os.path.join(folder, "documents"))
+        self.queries = EmbeddingStore(os.path.join(folder, "queries"), max_entries=query_cache_size)
+        self.query_cache_size = query_cache_size
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    @property
+    def underlying(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def load(self):
+        """Loads the embedding model now instead of on the first cache miss."""
+        return self.underlying
+
+    def embed_documents(self, texts):
+        keys = [cache_key(self.model_name, t) for t in texts]
+        cached = self.documents.get_many(keys)
+
+        # embed each unseen text once, even if it repeats in the batch
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in cached and k not in missing:
+                missing[k] = t
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            self.documents.put_many(list(missing.keys()), vectors)
+            cached.update(zip(missing.keys(), np.asarray(vectors, dtype=np.float32)))
+            print(f"[embedding cache] embedded {len(missing)} new of {len(texts)} texts")
+        incr("document_embedding_cache", len(texts) - len(missing), result="hit")
+        incr("document_embedding_cache", len(missing), result="miss")
+
+        return [cached[k].tolist() for k in keys]
+
+    def embed_query(self, text):
+        key = cache_key(self.model_name, text)
+        with self._lru_lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                incr("query_embedding_cache", result="memory")
+                return self._lru[key]
+
+        with span("embed_query") as s:
+            vector = self.queries.get_many([key]).get(key)
+            if vector is None:
+                vector = np.asarray(self.underlying.embed_query(text), dtype=np.float32)
+                self.queries.put_many([key], vector[None, :])
+                s.set(cache="miss")
+            else:
+                s.set(cache="disk")
+            incr("query_embedding_cache", result=s.attrs["cache"])
+        vector = vector.tolist()
+
+        with self._lru_lock:
+            self._lru[key] = vector
+            while len(self._lru) > self.query_cache_size:
+                self._lru.popitem(last=False)
+        return vector
@@ -0,0 +1,10 @@
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges several ranked lists of ids with Reciprocal Rank Fusion:
+    score(id) = sum over lists of 1 / (k + rank). Returns ids sorted by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from rag_system.config import COLLECTIONS, INDEX_DEFAULTS
+
+# A saved collection lives in faiss_store/<name>/index.faiss/: every save writes a new
+# gen-* directory and then points CURRENT at it, so a reader never mixes the index of
+# one save with the docstore of another.
+CURRENT = "CURRENT"
+INDEX_FILE = "index.faiss"
+DOCSTORE_DATA = "docstore.bin"  # utf-8 JSON records back to back
+DOCSTORE_OFFSETS = "docstore.offsets"  # int64 record boundaries (n + 1)
+DOCSTORE_IDS = "docstore.json"  # chunk ids in index order
+
+
+def index_spec(collection_key):
+    """Index settings of a collection: INDEX_DEFAULTS overridden by its "index" entry."""
+    return {**INDEX_DEFAULTS, **COLLECTIONS[collection_key].get("index", {})}
+
+
+def make_index(vectors, spec):
+    """
+    Builds a FAISS index of the configured type over the vectors (L2, like FAISS.from_documents).
+    flat  - exact search, 4 bytes per dimension
+    ivfpq - inverted lists of product-quantized codes, trained on the corpus (pq_m bytes per vector)
+    hnsw  - graph search over full vectors, fast but larger than flat
+    """
+    n, dim = vectors.shape
+    kind = spec["type"]
+
+    if kind == "ivfpq":
+        # k-means wants ~39 training points per list, and PQ needs 2^bits points per sub-quantizer
+        nlist = max(1, min(spec["nlist"], n // 39))
+        if n < 2 ** spec["pq_bits"] or dim % spec["pq_m"]:
+            print(f"[warn] {n} vectors cannot train IVF-PQ (m={spec['pq_m']}), using a flat index.")
+            kind = "flat"
+        else:
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, spec["pq_m"], spec["pq_bits"])
+            index.train(vectors)
+            # reranking reads candidate vectors back by position
+            index.make_direct_map()
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["hnsw_m"])
+        index.hnsw.efConstruction = spec["ef_construction"]
+    elif kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind != "ivfpq":
+        raise ValueError(f"unknown index type: {kind}")
+
+    index.add(vectors)
+    apply_search_params(index, spec)
+    return index
+
+
+def apply_search_params(index, spec):
+    """Sets the query-time knobs (not all of them survive write_index/read_index)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = spec["nprobe"]
+        if index.direct_map.type == faiss.DirectMap.NoMap:
+            index.make_direct_map()
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = spec["ef_search"]
+
+
+def supports_removal(index):
+    # langchain's FAISS.delete renumbers positions, which only matches a flat index
+    return isinstance(index, faiss.IndexFlat)
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """
+    Read-only view of a saved docstore: records are decoded from a memory-mapped file on
+    lookup instead of unpickling every chunk into RAM. Adds and deletes (incremental sync)
+    are kept in memory until the store is written again.
+    """
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, DOCSTORE_IDS), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(folder, DOCSTORE_OFFSETS), mmap_mode="r")
+        data = os.path.join(folder, DOCSTORE_DATA)
+        self.data = np.memmap(data, dtype=np.uint8, mode="r") if os.path.getsize(data) else b""
+        self.added = {}
+        self.deleted = set()
+
+    def search(self, search):
+        # same contract as InMemoryDocstore: a message string when the id is unknown
+        if search in self.added:
+            return self.added[search]
+        row = self.rows.get(search)
+        if row is None or search in self.deleted:
+            return f"ID {search} not found."
+        record = json.loads(bytes(self.data[self.offsets[row] : self.offsets[row + 1]]))
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def add(self, texts):
+        self.added.update(texts)
+        self.deleted.difference_update(texts)
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.added.pop(doc_id, None)
+            if doc_id in self.rows:
+                self.deleted.add(doc_id)
+
+
+def write_docstore(folder, ids, docs):
+    offsets, position = [0], 0
+    with open(os.path.join(folder, DOCSTORE_DATA), "wb") as f:
+        for doc in docs:
+            record = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}).encode("utf-8")
+            f.write(record)
+            position += len(record)
+            offsets.append(position)
+    with open(os.path.join(folder, DOCSTORE_OFFSETS), "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(folder, DOCSTORE_IDS), "w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+
+
+def current_generation(folder):
+    """Name of the saved generation readers should load, None before the first save."""
+    try:
+        with open(os.path.join(folder, CURRENT), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_vectorstore(vectorstore, folder):
+    """
+    Writes the FAISS index and a memory-mappable docstore (no pickle) into a new
+    generation and makes it current with one rename. Returns the generation name.
+    """
+    previous = current_generation(folder)
+    generation = f"gen-{time.time_ns()}-{os.getpid()}"
+    target = os.path.join(folder, generation)
+    os.makedirs(target)
+    faiss.write_index(vectorstore.index, os.path.join(target, INDEX_FILE))
+    ids = [vectorstore.index_to_docstore_id[pos] for pos in range(vectorstore.index.ntotal)]
+    write_docstore(target, ids, (vectorstore.docstore.search(i) for i in ids))
+
+    tmp = os.path.join(folder, f"{CURRENT}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp, os.path.join(folder, CURRENT))
+
+    # a reader that just read CURRENT may still be opening the previous generation
+    for name in os.listdir(folder):
+        if name.startswith("gen-") and name not in (generation, previous):
+            shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+    return generation
+
+
+def build_vectorstore(docs, embeddings, spec):
+    """Embeds the chunks and indexes them with the configured index type."""
+    ids = [d.metadata["doc_id"] for d in docs]
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+    index = make_index(vectors, spec)
+    # kept in RAM only until saved; loading goes through MmapDocstore
+    docstore = InMemoryDocstore(dict(zip(ids, docs)))
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def load_vectorstore(folder, embeddings, spec, generation=None):
+    """Loads one saved generation (the current one by default)."""
+    folder = os.path.join(folder, generation or current_generation(folder))
+    index = faiss.read_index(os.path.join(folder, INDEX_FILE))
+    apply_search_params(index, spec)
+    docstore = MmapDocstore(folder)
+    return FAISS(embeddings, index, docstore, dict(enumerate(docstore.ids)))
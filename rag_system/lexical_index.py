@@ -0,0 +1,143 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# identifiers keep their dots / dashes / underscores ("asset.get_by_guid", "snowflake-crawler")
+_token = re.compile(r"[a-z0-9_]+(?:[.\-/][a-z0-9_]+)*")
+_part = re.compile(r"[a-z0-9]+")
+_separator = re.compile(r"[.\-/]")
+_stopwords = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or our so "
+    "that the their them then there these this to was we were what when where which who why will "
+    "with you your".split()
+)
+
+# folder -> (version, LexicalIndex)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercased terms; compound identifiers are indexed whole and by their parts."""
+    terms = []
+    for token in _token.findall(text.lower()):
+        if token not in _stopwords:
+            terms.append(token)
+        parts = _part.findall(token)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p not in _stopwords)
+            # asset.get_by_guid -> also get_by_guid
+            terms.extend(seg for seg in _separator.split(token) if "_" in seg and seg != token)
+    return terms
+
+
+def index_files(folder):
+    return (
+        os.path.join(folder, "postings.bin"),
+        os.path.join(folder, "terms.json"),
+        os.path.join(folder, "docs.json"),
+    )
+
+
+def build_lexical_index(folder, doc_ids, texts):
+    """
+    Writes an inverted index for the given chunks:
+    postings.bin - int32 (doc, term frequency) pairs grouped by term
+    terms.json   - term -> [first posting row, document frequency]
+    docs.json    - chunk ids and lengths (in terms)
+    """
+    os.makedirs(folder, exist_ok=True)
+    postings, lengths = {}, []
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    terms, rows = {}, []
+    for term in sorted(postings):
+        terms[term] = [len(rows), len(postings[term])]
+        rows.extend(postings[term])
+
+    postings_path, terms_path, docs_path = index_files(folder)
+    # write the data files first and docs.json last, it marks the index as complete
+    np.asarray(rows, dtype=np.int32).reshape(-1, 2).tofile(postings_path + ".tmp")
+    os.replace(postings_path + ".tmp", postings_path)
+    with open(terms_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(terms, f)
+    os.replace(terms_path + ".tmp", terms_path)
+    with open(docs_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"ids": list(doc_ids), "lengths": lengths}, f)
+    os.replace(docs_path + ".tmp", docs_path)
+
+
+class LexicalIndex:
+    """BM25 search over an on-disk inverted index; postings are memory-mapped."""
+
+    def __init__(self, folder):
+        postings_path, terms_path, docs_path = index_files(folder)
+        with open(terms_path, "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        with open(docs_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.ids = docs["ids"]
+        self.lengths = np.asarray(docs["lengths"], dtype=np.float32)
+        self.avgdl = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        size = os.path.getsize(postings_path)
+        self.postings = (
+            np.memmap(postings_path, dtype=np.int32, mode="r").reshape(-1, 2)
+            if size
+            else np.empty((0, 2), dtype=np.int32)
+        )
+
+    def search(self, query, k):
+        """Top-k (chunk id, BM25 score) pairs for the query."""
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        for term, qtf in Counter(tokenize(query)).items():
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            rows = np.asarray(self.postings[start : start + df])
+            docs, tf = rows[:, 0], rows[:, 1].astype(np.float32)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[docs] / self.avgdl)
+            scores[docs] += qtf * idf * tf * (K1 + 1) / (tf + norm)
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.ids[i], float(scores[i])) for i in hits]
+
+
+def index_version(folder):
+    try:
+        return tuple(os.stat(p).st_mtime_ns for p in index_files(folder))
+    except FileNotFoundError:
+        return None
+
+
+def load_lexical_index(folder):
+    """Cached LexicalIndex for a folder, reloaded when its files change. None if not built."""
+    version = index_version(folder)
+    if version is None:
+        return None
+    cached = _loaded.get(folder)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _loaded_lock:
+        cached = _loaded.get(folder)
+        if cached is None or cached[0] != version:
+            cached = _loaded[folder] = (version, LexicalIndex(folder))
+        return cached[1]
@@ -0,0 +1,396 @@
+"""
+Shared Gemini client: memoized model objects plus generate / generate_async /
+generate_stream, which add a per-key token-bucket rate limit, retries with jittered
+exponential backoff, an overall deadline, optional hedged requests and a per-model
+circuit breaker. set_model_factory swaps the models for a local stub
+(e.g. benchmarks/fake_llm.py), everything else works the same against it.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from rag_system.config import (
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_BURST,
+    LLM_CIRCUIT_FAILURES,
+    LLM_CIRCUIT_RESET,
+    LLM_DEADLINE,
+    LLM_HEDGE_AFTER,
+    LLM_MAX_RETRIES,
+    LLM_RATE,
+    LLM_TIMEOUT,
+)
+from rag_system.telemetry import incr
+
+# transient failures worth another attempt; anything else (bad request, auth) is raised at once
+RETRYABLE = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+
+_lock = threading.Lock()
+_models = {}
+# event loop -> {model key: model}; a grpc.aio channel belongs to the loop it was created on
+_async_models = weakref.WeakKeyDictionary()
+_buckets = {}
+_breakers = {}
+
+# runs the competing requests of a hedged call
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    """The model failed repeatedly; calls fail fast until the breaker lets a probe through."""
+
+
+class DeadlineExceededError(LLMError, TimeoutError):
+    """The call (all attempts included) did not finish within its deadline."""
+
+
+class ResponseTimeoutError(LLMError, TimeoutError):
+    """One attempt got no response within its timeout (retried like other timeouts)."""
+
+
+def _gemini_model(model_name, generation_config, api_key=None):
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    # a client bound to this key: genai.configure is process-wide, and the analysis and
+    # RAG keys would overwrite each other between threads. The async client opens a
+    # grpc.aio channel, which needs a running event loop; see get_async_model.
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
+
+
+def _gemini_async_model(model_name, generation_config, api_key=None):
+    # must run on the event loop that will use it
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    model._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    return model
+
+
+# builds the model objects; swapped for a local stand-in by benchmarks and tests
+_factory = _gemini_model
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Takes a token and returns how long to wait before using it (the balance may go negative)."""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def cancel(self):
+        """Returns a reserved token that will not be used."""
+        with self.lock:
+            self.tokens += 1
+
+    def try_take(self):
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive transient failures. While open, calls fail
+    fast; after `reset_s` one call is let through as a probe and its outcome closes
+    the breaker again or keeps it open for another `reset_s`.
+    """
+
+    def __init__(self, failures, reset_s):
+        self.failures = failures
+        self.reset_s = reset_s
+        self.count = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_s:
+                # half-open: this caller probes, the others keep failing fast meanwhile
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.count = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.count += 1
+            if self.count >= self.failures:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "open"
+
+
+def set_model_factory(factory):
+    """
+    Replaces the model constructor, factory(model_name, generation_config) -> object with
+    generate_content / generate_content_async. None restores Gemini. Memoized models,
+    rate limits and circuit breakers are reset.
+    """
+    global _factory
+    with _lock:
+        _factory = factory or _gemini_model
+        _models.clear()
+        _async_models.clear()
+        _buckets.clear()
+        _breakers.clear()
+
+
+def _model_key(model_name, api_key, generation_config):
+    return model_name, api_key, tuple(sorted((generation_config or {}).items()))
+
+
+def get_model(model_name, api_key, generation_config=None):
+    """
+    Memoized GenerativeModel: created once per (model, API key, generation config)
+    and reused for every request, each with its own client for that key.
+    """
+    key = _model_key(model_name, api_key, generation_config)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                if _factory is _gemini_model:
+                    model = _gemini_model(model_name, generation_config, api_key)
+                else:
+                    model = _factory(model_name, generation_config)
+                _models[key] = model
+    return model
+
+
+def get_async_model(model_name, api_key, generation_config=None):
+    """
+    get_model for coroutines: memoized per running event loop, since the async gRPC
+    client cannot be shared between loops (asyncio.run makes a new one per call).
+    """
+    if _factory is not _gemini_model:
+        return get_model(model_name, api_key, generation_config)
+    loop = asyncio.get_running_loop()
+    key = _model_key(model_name, api_key, generation_config)
+    with _lock:
+        models = _async_models.setdefault(loop, {})
+        model = models.get(key)
+        if model is None:
+            model = models[key] = _gemini_async_model(model_name, generation_config, api_key)
+    return model
+
+
+def _bucket(api_key):
+    # quotas are per API key
+    bucket = _buckets.get(api_key)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.setdefault(api_key, TokenBucket(LLM_RATE, LLM_BURST))
+    return bucket
+
+
+def breaker(model_name):
+    b = _breakers.get(model_name)
+    if b is None:
+        with _lock:
+            b = _breakers.setdefault(model_name, CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET))
+    return b
+
+
+def _before_attempt(model_name, api_key, end):
+    """Checks deadline and breaker, takes a rate token. Returns (seconds to wait, attempt timeout)."""
+    remaining = end - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededError(f"{model_name}: deadline exceeded")
+    if not breaker(model_name).allow():
+        incr("llm_circuit_rejected", model=model_name)
+        raise CircuitOpenError(f"{model_name}: circuit open after repeated failures")
+    bucket = _bucket(api_key)
+    delay = bucket.reserve()
+    if delay >= remaining:
+        bucket.cancel()
+        raise DeadlineExceededError(f"{model_name}: rate limit wait exceeds the deadline")
+    return delay, min(LLM_TIMEOUT, remaining - delay)
+
+
+def _retry_delay(model_name, attempt, error, end):
+    """Backoff before the next attempt, or None when the call should give up."""
+    breaker(model_name).failure()
+    incr("llm_errors", model=model_name, error=type(error).__name__)
+    # full jitter: spreads retries of concurrent tickets apart
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**attempt))
+    if attempt >= LLM_MAX_RETRIES or time.monotonic() + delay >= end:
+        return None
+    incr("llm_retries", model=model_name)
+    return delay
+
+
+def _call(model, model_name, api_key, prompt, timeout, hedge_after):
+    """One attempt; with hedging a second identical request races the first after hedge_after s."""
+    options = {"timeout": timeout}
+    if hedge_after is None or hedge_after >= timeout:
+        return model.generate_content(prompt, request_options=options)
+
+    pending = {_hedge_pool.submit(model.generate_content, prompt, request_options=options)}
+    done, pending = wait(pending, timeout=hedge_after)
+    # hedges only use spare rate budget
+    if not done and _bucket(api_key).try_take():
+        incr("llm_hedges", model=model_name)
+        pending.add(_hedge_pool.submit(model.generate_content, prompt, request_options=options))
+
+    error = None
+    deadline = time.monotonic() + timeout
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+        if not pending:
+            raise error
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ResponseTimeoutError(f"{model_name}: no response within {timeout:.1f}s")
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+
+async def _call_async(model, model_name, api_key, prompt, timeout, hedge_after):
+    options = {"timeout": timeout}
+    tasks = {asyncio.ensure_future(model.generate_content_async(prompt, request_options=options))}
+    try:
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and _bucket(api_key).try_take():
+                incr("llm_hedges", model=model_name)
+                tasks.add(asyncio.ensure_future(model.generate_content_async(prompt, request_options=options)))
+
+        error = None
+        deadline = time.monotonic() + timeout
+        while tasks:
+            remaining = deadline - time.monotonic()
+            done, tasks = await asyncio.wait(tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise ResponseTimeoutError(f"{model_name}: no response within {timeout:.1f}s")
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        # the losing request is not needed any more
+        for task in tasks:
+            task.cancel()
+
+
+def generate(model_name, api_key, prompt, generation_config=None, deadline=LLM_DEADLINE, hedge_after=LLM_HEDGE_AFTER):
+    """generate_content with rate limiting, retries, a deadline (s) for all attempts, hedging and a circuit breaker."""
+    model = get_model(model_name, api_key, generation_config)
+    end = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        delay, timeout = _before_attempt(model_name, api_key, end)
+        time.sleep(delay)
+        try:
+            resp = _call(model, model_name, api_key, prompt, timeout, hedge_after)
+        except RETRYABLE as e:
+            backoff = _retry_delay(model_name, attempt, e, end)
+            if backoff is None:
+                raise
+            time.sleep(backoff)
+            attempt += 1
+            continue
+        breaker(model_name).success()
+        return resp
+
+
+async def generate_async(model_name, api_key, prompt, generation_config=None, deadline=LLM_DEADLINE, hedge_after=LLM_HEDGE_AFTER):
+    """Async generate(): same limits, sleeps without blocking the event loop."""
+    model = get_async_model(model_name, api_key, generation_config)
+    end = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        delay, timeout = _before_attempt(model_name, api_key, end)
+        await asyncio.sleep(delay)
+        try:
+            resp = await _call_async(model, model_name, api_key, prompt, timeout, hedge_after)
+        except RETRYABLE as e:
+            backoff = _retry_delay(model_name, attempt, e, end)
+            if backoff is None:
+                raise
+            await asyncio.sleep(backoff)
+            attempt += 1
+            continue
+        breaker(model_name).success()
+        return resp
+
+
+def generate_stream(model_name, api_key, prompt, generation_config=None, deadline=LLM_DEADLINE):
+    """
+    Streaming generate_content, yielding response chunks. Attempts are retried like
+    generate() until the first chunk arrives; after that an error ends the stream.
+    """
+    model = get_model(model_name, api_key, generation_config)
+    end = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        delay, timeout = _before_attempt(model_name, api_key, end)
+        time.sleep(delay)
+        try:
+            chunks = iter(model.generate_content(prompt, stream=True, request_options={"timeout": timeout}))
+            first = next(chunks, None)
+        except RETRYABLE as e:
+            backoff = _retry_delay(model_name, attempt, e, end)
+            if backoff is None:
+                raise
+            time.sleep(backoff)
+            attempt += 1
+            continue
+        breaker(model_name).success()
+        if first is not None:
+            yield first
+        yield from chunks
+        return
+
+
+def circuit_states():
+    """Breaker state per model, for the health endpoint."""
+    return {name: b.state for name, b in list(_breakers.items())}
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_embeddings, candidate_embeddings, alpha=0.5, top_k=4, mask=None):
+    """
+    Vectorized Maximal Marginal Relevance for a batch of queries.
+    - query_embeddings: (B, d)
+    - candidate_embeddings: (B, n, d)
+    - mask: optional (B, n) bool array, False marks padding
+    Returns an int array (B, top_k) of selected candidate positions, -1 where a
+    query ran out of candidates.
+    """
+    queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    batch, n, _ = candidates.shape
+    top_k = min(top_k, n)
+    rows = np.arange(batch)
+
+    # similarity of every candidate to its query, one batched matmul
+    sim_to_query = np.einsum("bnd,bd->bn", candidates, queries)
+    relevance = alpha * sim_to_query
+
+    # running max similarity to anything already selected; -inf until the first pick,
+    # since the true maximum can be negative
+    max_sim = np.full((batch, n), -np.inf, dtype=np.float32)
+    available = np.ones((batch, n), dtype=bool) if mask is None else np.asarray(mask, dtype=bool).copy()
+
+    selected = np.full((batch, top_k), -1, dtype=np.int64)
+    for step in range(top_k):
+        redundancy = np.where(np.isinf(max_sim), 0, max_sim)
+        scores = np.where(available, relevance - (1 - alpha) * redundancy, -np.inf)
+        best = scores.argmax(axis=1)
+        has_any = available[rows, best]
+        selected[:, step] = np.where(has_any, best, -1)
+        available[rows, best] = False
+
+        # only the newly picked vector can raise the max, so each step is one matvec per query
+        sim_to_best = np.einsum("bnd,bd->bn", candidates, candidates[rows, best])
+        max_sim = np.maximum(max_sim, sim_to_best)
+
+    return selected
+
+
+def mmr_rerank(query_embedding, candidate_embeddings, candidate_texts, alpha=0.5, top_k=4):
+    """
+    Maximal Marginal Relevance (MMR) reranker for a single query.
+    - candidate_embeddings: embeddings of retrieved documents
+    - candidate_texts: original document objects
+    """
+    if len(candidate_texts) == 0:
+        return []
+    selected = mmr_select(
+        np.asarray(query_embedding)[None, :],
+        np.asarray(candidate_embeddings)[None, :, :],
+        alpha=alpha,
+        top_k=top_k,
+    )[0]
+    return [candidate_texts[i] for i in selected if i != -1]
+
+
+def mmr_rerank_batch(query_embeddings, candidate_embeddings, candidate_texts, alpha=0.5, top_k=4):
+    """
+    Reranks several queries in one call. Candidate lists may differ in length;
+    they are padded and masked so the whole batch runs as matrix ops.
+    """
+    if not candidate_texts:
+        return []
+    dim = len(query_embeddings[0])
+    n = max(len(texts) for texts in candidate_texts)
+    if n == 0:
+        return [[] for _ in candidate_texts]
+
+    padded = np.zeros((len(candidate_texts), n, dim), dtype=np.float32)
+    mask = np.zeros((len(candidate_texts), n), dtype=bool)
+    for b, vectors in enumerate(candidate_embeddings):
+        if len(vectors):
+            padded[b, : len(vectors)] = vectors
+            mask[b, : len(vectors)] = True
+
+    selected = mmr_select(query_embeddings, padded, alpha=alpha, top_k=top_k, mask=mask)
+    return [[texts[i] for i in row if i != -1] for texts, row in zip(candidate_texts, selected)]
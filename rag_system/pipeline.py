@@ -1,31 +1,164 @@
+from collections import deque
 from time import time
 
-from rag_system.answer_generator import answer_with_context
-from rag_system.config import COLLECTIONS
-from rag_system.query_classifier import classify_query
-from rag_system.vector_store import build_index, rag_search
-
-
-def rag_answer(q):
-    start = time()
-    # Build indices (only first run)
-    for key, val in COLLECTIONS.items():
-        build_index(val["name"], val["file"])
-    
-    # adding a label on it for better classification
-    label = classify_query(q)
-    print(f"\nClassified as: {label}")
-    
-    try:
-        results = rag_search(q, label)
-        print(results)
+from rag_system.answer_cache import SemanticAnswerCache
+from rag_system.answer_generator import ANSWER_MODEL, answer_with_context, answer_with_context_stream
+from rag_system.config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    COLLECTIONS,
+    CONTEXT_TOKEN_BUDGET,
+    FETCH_K,
+    SEARCH_MODE,
+    get_rag_key,
+)
+from rag_system.context_packer import pack_context
+from rag_system.llm import get_model
+from rag_system.query_classifier import CLASSIFY_MODEL
+from rag_system.router import collection_centroids, route_query
+from rag_system.telemetry import activate, incr, span, start_span
+from rag_system.vector_store import (
+    embedding_function,
+    rag_search,
+    rag_search_all,
+    sync_index,
+    warmup_retrievers,
+)
+
+# answers for near-duplicate tickets, shared by the whole process
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE)
+
+# per-request prompt size and generation latency, for tuning k / fetch_k
+_context_stats = deque(maxlen=1000)
+
+
+def warmup():
+    """
+    Loads everything a ticket needs up front: the embedding model, every collection
+    (built if missing) with its router centroids, and the Gemini model objects.
+    Optional - each piece is otherwise loaded on first use.
+    """
+    embedding_function.load()
+    warmup_retrievers()
+    for key in COLLECTIONS:
+        collection_centroids(key)
+    get_model(ANSWER_MODEL, get_rag_key())
+    get_model(CLASSIFY_MODEL, get_rag_key())
+
+
+def refresh_knowledge_base():
+    """Syncs every collection with its knowledge base file and drops cached answers built on removed chunks."""
+    results = [sync_index(key) for key in COLLECTIONS]
+    for r in results:
+        answer_cache.invalidate_chunks(r["removed_ids"])
+    return results
+
+
+def classify(q, label=None, query_embedding=None):
+    """The ticket's collection: the given label, else routed locally (LLM only for ambiguous queries)."""
+    if label in COLLECTIONS:
+        return label
+    with span("classify") as s:
+        label = route_query(q, query_embedding)
+        s.set(label=label)
+    return label
+
+
+def retrieve(q, label=None):
+    """Context chunks for a query, from the routed collection or from all of them (fan-out mode)."""
+    with span("retrieve", mode=SEARCH_MODE) as s:
+        if SEARCH_MODE == "fanout":
+            # every knowledge base at once, classification is off the critical path
+            results = rag_search_all(q)
+        else:
+            label = classify(q, label)
+            results = rag_search(q, label)
+        s.set(label=label, results=len(results))
+        return results
+
+
+def pack(results):
+    """Packs retrieved chunks into the token budget and records the packed size."""
+    with span("pack_context", retrieved=len(results)) as s:
+        packed, tokens = pack_context(results, CONTEXT_TOKEN_BUDGET)
+        s.set(chunks=len(packed), context_tokens=tokens)
+    stats = {"time": time(), "k": len(results), "fetch_k": FETCH_K, "chunks": len(packed), "context_tokens": tokens}
+    _context_stats.append(stats)
+    return packed, stats
+
+
+def lookup_cached(query_embedding):
+    cached = answer_cache.lookup(query_embedding)
+    incr("answer_cache", result="miss" if cached is None else "hit")
+    return cached
+
+
+def context_stats():
+    """Recent requests: retrieved k, fetch_k, packed chunk count, context tokens and generate seconds."""
+    return list(_context_stats)
+
+
+def rag_answer(q, label=None):
+    """
+    Answers a query from the knowledge base.
+    label: collection already chosen for this ticket (e.g. by model.analyze); routed locally when missing.
+    LLM failures that outlast the client's retries (rag_system.llm) are raised, not hidden.
+    """
+    with span("rag_answer") as root:
+        # near-duplicate of an already answered ticket?
+        query_embedding = embedding_function.embed_query(q)
+        cached = lookup_cached(query_embedding)
+        if cached is not None:
+            root.set(answer_cache="hit", citations=cached["citations"])
+            return cached["answer"]
+
+        results = retrieve(q, label)
         # answering based on retrieved context
-        final_answer = answer_with_context(q, results)
-        print("\n--- FINAL ANSWER ---")
-        print(final_answer)
-        end = time()
-        print(end-start)
+        context, stats = pack(results)
+        gen_start = time()
+        final_answer = answer_with_context(q, context)
+        stats["generate_s"] = time() - gen_start
+        answer_cache.add(query_embedding, final_answer, results)
+        root.set(answer_cache="miss", citations=[r["url"] for r in context])
         return final_answer
+
+
+def rag_answer_stream(q, label=None):
+    """
+    Streaming version of rag_answer: yields answer text as it is generated.
+    The complete answer is added to the answer cache once the stream finishes.
+    """
+    # ended by hand, the generator is resumed from other contexts while streaming
+    root = start_span("rag_answer_stream")
+    try:
+        # only the steps between yields run with the span current
+        with activate(root):
+            query_embedding = embedding_function.embed_query(q)
+            cached = lookup_cached(query_embedding)
+            if cached is None:
+                results = retrieve(q, label)
+                context, stats = pack(results)
+        if cached is not None:
+            root.set(answer_cache="hit")
+            yield cached["answer"]
+            return
+
+        gen_start = time()
+        parts = []
+        for text in answer_with_context_stream(q, context, parent=root):
+            if not parts:
+                stats["first_token_s"] = time() - gen_start
+            parts.append(text)
+            yield text
+        stats["generate_s"] = time() - gen_start
+
+        final_answer = "".join(parts).strip()
+        if final_answer:
+            answer_cache.add(query_embedding, final_answer, results)
+        root.set(answer_cache="miss")
     except Exception as e:
-        print("Exception occured :", e)
-        return None
\ No newline at end of file
+        root.end(error=e)
+        raise
+    finally:
+        root.end()
@@ -1,24 +1,26 @@
-import google.generativeai as genai
+from rag_system.config import CLASSIFY_HEDGE_AFTER, get_rag_key
+from rag_system.llm import generate
 
-from rag_system.config import get_rag_key
+CLASSIFY_MODEL = "models/gemini-2.5-flash-lite-preview-06-17"
 
-from .config import get_rag_key
-
-# Configure Gemini
-genai.configure(api_key=get_rag_key())
-
-def classify_query(query: str) -> str:
-    prompt = f"""
+def build_classify_prompt(query: str) -> str:
+    return f"""
         Given the user query, decide whether it should be answered using the developer knowledge base (technical API / SDK / code-focused content) or the documentation knowledge base (user guides, best practices, feature overviews).
         If the query involves implementation details, dev errors, or code usage, choose developer.
         If it involves product usage, configuration, or administrative guidance, choose documentation.
         Query: {query}
         Answer with one word: developer, documentation.
     """
-    model = genai.GenerativeModel("models/gemini-2.5-flash-lite-preview-06-17")
-    resp = model.generate_content(prompt)
-    label = resp.text.strip().lower()
+
+
+def parse_label(text: str) -> str:
+    label = text.strip().lower()
     if "dev" in label:
         return "developer"
     else:
-        return "documentation"
\ No newline at end of file
+        return "documentation"
+
+
+def classify_query(query: str) -> str:
+    resp = generate(CLASSIFY_MODEL, get_rag_key(), build_classify_prompt(query), hedge_after=CLASSIFY_HEDGE_AFTER)
+    return parse_label(resp.text)
\ No newline at end of file
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+from rag_system.config import COLLECTIONS, ROUTER_MARGIN
+from rag_system.query_classifier import classify_query
+from rag_system.vector_store import embedding_function, get_vectorstore, index_version
+
+# collection_name -> (index version, (n_sections, d) normalized section centroids)
+_centroids = {}
+_centroids_lock = threading.Lock()
+
+_stats = {"local": 0, "fallback": 0}
+_stats_lock = threading.Lock()
+
+
+def _normalize(x):
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def collection_centroids(collection_key):
+    """
+    One centroid per section of the collection (e.g. 'sdks', 'snippets', 'product'),
+    computed from the vectors already stored in the index and cached per index version.
+    """
+    name = COLLECTIONS[collection_key]["name"]
+    version = index_version(name)
+    cached = _centroids.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _centroids_lock:
+        cached = _centroids.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        vectorstore = get_vectorstore(collection_key)
+        vectors = _normalize(vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal))
+
+        sections = {}
+        for pos, doc_id in vectorstore.index_to_docstore_id.items():
+            doc = vectorstore.docstore.search(doc_id)
+            section = doc.metadata.get("section", "") if hasattr(doc, "metadata") else ""
+            sections.setdefault(section, []).append(pos)
+
+        centroids = _normalize(np.stack([vectors[rows].mean(axis=0) for rows in sections.values()]))
+        _centroids[name] = (version, centroids)
+        return centroids
+
+
+def score_collections(query_embedding):
+    """Similarity of the query to each collection: best match among its section centroids."""
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    return {key: float((collection_centroids(key) @ query).max()) for key in COLLECTIONS}
+
+
+def route_locally(query_embedding):
+    """
+    The collection whose centroids best match the query, or None when the two best
+    collections are closer than ROUTER_MARGIN (the caller should ask the LLM).
+    """
+    ranked = sorted(score_collections(query_embedding).items(), key=lambda kv: kv[1], reverse=True)
+    margin = ranked[0][1] - ranked[1][1] if len(ranked) > 1 else float("inf")
+
+    with _stats_lock:
+        if margin >= ROUTER_MARGIN:
+            _stats["local"] += 1
+            return ranked[0][0]
+        _stats["fallback"] += 1
+        return None
+
+
+def route_query(query, query_embedding=None):
+    """
+    Picks the collection for a query locally from its embedding. When the two best
+    collections are closer than ROUTER_MARGIN the LLM classifier decides instead.
+    """
+    if query_embedding is None:
+        query_embedding = embedding_function.embed_query(query)
+    return route_locally(query_embedding) or classify_query(query)
+
+
+def router_stats():
+    """How many queries were routed locally vs. sent to the LLM fallback."""
+    with _stats_lock:
+        total = _stats["local"] + _stats["fallback"]
+        return {
+            "local": _stats["local"],
+            "fallback": _stats["fallback"],
+            "fallback_rate": _stats["fallback"] / total if total else 0.0,
+        }
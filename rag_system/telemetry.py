@@ -0,0 +1,253 @@
+"""
+Lightweight tracing and metrics for the RAG pipeline.
+
+    with span("similarity_search", collection=key) as s:
+        ...
+        s.set(candidates=len(docs))
+    incr("answer_cache", result="hit")
+
+A span opened inside another span joins its trace. When the outermost span of a trace
+ends, the trace is kept in memory (recent_traces) and handed to every sink (e.g. a
+JsonlSink). Span durations per stage and counters are aggregated for stage_summary()
+and for the Prometheus text format (prometheus_text), served by api.py at /metrics.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from rag_system.config import TELEMETRY_LOG, TRACE_BUFFER
+
+# histogram buckets for stage durations, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("rag_span", default=None)
+_lock = threading.Lock()
+_sinks = []
+
+_traces = deque(maxlen=TRACE_BUFFER)
+# stage -> recent durations (s), for percentiles
+_recent = defaultdict(lambda: deque(maxlen=1000))
+# stage -> [count per bucket..., +Inf count, total seconds]
+_histograms = {}
+# (name, sorted label pairs) -> value
+_counters = defaultdict(float)
+
+
+class Span:
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.attrs = dict(attrs or {})
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        # finished spans of the trace, kept on the root only
+        self.spans = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _finish(self)
+
+    def record(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "start": self.started,
+            "duration_ms": round(self.duration * 1e3, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, parent=None, **attrs):
+    """
+    A span that is not made current: for work that spans generator yields, where a
+    context variable cannot be reset safely. Call .end() when done.
+    """
+    return Span(name, parent if parent is not None else _current.get(), attrs)
+
+
+@contextmanager
+def span(name, parent=None, **attrs):
+    s = start_span(name, parent, **attrs)
+    try:
+        with activate(s):
+            yield s
+    except BaseException as e:
+        s.end(error=e)
+        raise
+    finally:
+        s.end()
+
+
+@contextmanager
+def activate(s):
+    """Makes an existing span current for a block (e.g. one started with start_span)."""
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+
+
+def bind(fn):
+    """Wraps fn so that spans it opens in another thread join the caller's trace."""
+    parent = _current.get()
+
+    def run(*args, **kwargs):
+        with activate(parent):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def incr(name, value=1, **labels):
+    """Adds to a counter, e.g. incr("answer_cache", result="hit")."""
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += value
+
+
+def _finish(s):
+    with _lock:
+        _recent[s.name].append(s.duration)
+        hist = _histograms.get(s.name)
+        if hist is None:
+            hist = _histograms[s.name] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if s.duration <= bound:
+                hist[i] += 1
+        hist[len(BUCKETS)] += 1
+        hist[-1] += s.duration
+
+    s.root.spans.append(s.record())
+    if s.root is s:
+        trace = {
+            "trace_id": s.trace_id,
+            "name": s.name,
+            "start": s.started,
+            "duration_ms": round(s.duration * 1e3, 3),
+            "error": s.error,
+            "spans": sorted(s.spans, key=lambda r: r["start"]),
+        }
+        _traces.append(trace)
+        for sink in list(_sinks):
+            try:
+                sink.emit(trace)
+            except Exception as e:
+                print("Telemetry sink failed:", e)
+
+
+# sinks
+class JsonlSink:
+    """Appends every finished trace as one JSON line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def emit(self, trace):
+        line = json.dumps(trace, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+if TELEMETRY_LOG:
+    add_sink(JsonlSink(TELEMETRY_LOG))
+
+
+# readers
+def recent_traces(limit=50):
+    """Most recent finished traces, newest first."""
+    return list(_traces)[-limit:][::-1]
+
+
+def stage_summary():
+    """Per-stage latency over the recent window: count, mean / p50 / p95 / max in ms."""
+    with _lock:
+        recent = {name: np.asarray(d) * 1e3 for name, d in _recent.items() if d}
+    return {
+        name: {
+            "count": len(a),
+            "mean_ms": float(a.mean()),
+            "p50_ms": float(np.percentile(a, 50)),
+            "p95_ms": float(np.percentile(a, 95)),
+            "max_ms": float(a.max()),
+        }
+        for name, a in sorted(recent.items())
+    }
+
+
+def counters():
+    """Counter values keyed by name and labels, e.g. 'answer_cache{result="hit"}'."""
+    with _lock:
+        items = list(_counters.items())
+    return {_series(name, labels): value for (name, labels), value in sorted(items)}
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {name: list(h) for name, h in _histograms.items()}
+        counter_items = sorted(_counters.items())
+
+    lines = [
+        "# HELP rag_stage_duration_seconds Duration of pipeline stages.",
+        "# TYPE rag_stage_duration_seconds histogram",
+    ]
+    for name, hist in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS, hist):
+            lines.append(f'rag_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+        lines.append(f'rag_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {hist[len(BUCKETS)]}')
+        lines.append(f'rag_stage_duration_seconds_count{{stage="{name}"}} {hist[len(BUCKETS)]}')
+        lines.append(f'rag_stage_duration_seconds_sum{{stage="{name}"}} {hist[-1]}')
+
+    typed = set()
+    for (name, labels), value in counter_items:
+        metric = f"rag_{name}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{_series(metric, labels)} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -1,36 +1,113 @@
+import hashlib
 import json
-import uuid
+from urllib.parse import urlparse
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 
+_decoder = json.JSONDecoder()
+
+
+def chunk_id(url, offset, content):
+    """Deterministic chunk id: same page, position and text always map to the same id."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{url}\0{offset}\0".encode("utf-8"))
+    h.update(content.encode("utf-8"))
+    return h.hexdigest()
 
-# load the files and convert into chunks
-def load_json_file(file, chunk_size=500, overlap=50):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=overlap
-    )
-    all_chunks = []
+
+def iter_json_records(file, read_size=1 << 16):
+    """
+    Streams the objects of a top-level JSON array one by one, reading the file in
+    blocks instead of loading it whole. A file holding a single object yields it once;
+    a .jsonl file (as written by the scrapers) yields one object per line.
+    """
+    if file.endswith(".jsonl"):
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
 
     with open(file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        buf = f.read(read_size)
+        pos = 0
+        eof = not buf
+
+        def fill():
+            nonlocal buf, pos, eof
+            more = f.read(read_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
 
-    if isinstance(data, dict):
-        data = [data]
+        skip(" \t\r\n")
+        if pos >= len(buf):
+            return
+        if buf[pos] != "[":
+            # not an array: a single record
+            yield json.loads(buf[pos:] + f.read())
+            return
+        pos += 1
+
+        while True:
+            skip(" \t\r\n,")
+            if pos >= len(buf) or buf[pos] == "]":
+                return
+            try:
+                obj, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # a value touching the end of the buffer may be cut short (e.g. a number)
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            pos = end
+            yield obj
+
+
+def section_of(url):
+    """Top-level section of a page, e.g. 'sdks' for https://developer.atlan.com/sdks/python/."""
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    return parts[0] if parts else ""
+
+
+# stream the file and convert into chunks
+def iter_documents(file, chunk_size=500, overlap=50):
+    """
+    Single-pass chunker: yields one Document per chunk straight from the knowledge
+    base file, with url, character offset, section and a deterministic doc_id.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=overlap, add_start_index=True
+    )
 
-    for obj in data:
+    for obj in iter_json_records(file):
         url = obj.get("url", "N/A")
         content = obj.get("content") or obj.get("text") or ""
         if not content.strip():
             continue
-        chunks = splitter.split_text(content)
-        for chunk in chunks:
-            chunk_id = str(uuid.uuid4())
-            all_chunks.append(
-                {
-                    "doc_id": chunk_id,
-                    "content": chunk,
+        section = obj.get("section") or section_of(url)
+        for chunk in splitter.create_documents([content]):
+            offset = chunk.metadata["start_index"]
+            yield Document(
+                page_content=chunk.page_content,
+                metadata={
                     "url": url,
-                }
-            )
-    print(f"[debug] Extracted {len(all_chunks)} chunks from {file}")
-    return all_chunks
\ No newline at end of file
+                    "offset": offset,
+                    "section": section,
+                    "doc_id": chunk_id(url, offset, chunk.page_content),
+                },
+            )
\ No newline at end of file
@@ -1,97 +1,389 @@
+import json
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+import numpy as np
 
-from rag_system.config import COLLECTIONS, PERSIST_DIR
-from rag_system.text_processor import load_json_file
+from rag_system.config import (
+    COLLECTIONS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_MODEL,
+    FETCH_K,
+    HYBRID_SEARCH,
+    INDEX_DEFAULTS,
+    MMR_ALPHA,
+    PERSIST_DIR,
+    QUERY_CACHE_SIZE,
+    SEARCH_WORKERS,
+    TOP_K,
+)
+from rag_system.embedding_cache import CachedEmbeddings
+from rag_system.fusion import reciprocal_rank_fusion
+from rag_system.index_store import (
+    build_vectorstore,
+    current_generation,
+    index_spec,
+    load_vectorstore,
+    save_vectorstore,
+    supports_removal,
+)
+from rag_system.lexical_index import build_lexical_index, load_lexical_index
+from rag_system.mmr import mmr_rerank
+from rag_system.telemetry import bind, span
+from rag_system.text_processor import iter_documents
+
+
+def _load_embedding_model():
+    # imported here: sentence-transformers pulls in torch, which takes seconds to load
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
 
-# Embedding model
-embedding_function = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+
+# Embedding model, behind a persistent cache so unchanged text is never embedded twice.
+# The model is loaded lazily on the first text that is not in the cache.
+embedding_function = CachedEmbeddings(
+    _load_embedding_model,
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_DIR,
+    query_cache_size=QUERY_CACHE_SIZE,
 )
 
+# Loaded vectorstores kept for the lifetime of the process
+# collection_name -> (version, vectorstore, {docstore id: index position})
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+_lexical_lock = threading.Lock()
+
+# shared pool for fan-out searches (FAISS releases the GIL while searching)
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
+
+
+def index_path(collection_name):
+    return os.path.join(PERSIST_DIR, collection_name, "index.faiss")
+
+
+def lexical_path(collection_name):
+    return os.path.join(PERSIST_DIR, collection_name, "lexical")
+
 
 def index_exists(collection_name):
-    store_dir = os.path.join(PERSIST_DIR, collection_name)
-    faiss_index_path = os.path.join(store_dir, "index.faiss")
-    return os.path.exists(faiss_index_path)
+    return index_version(collection_name) is not None
+
+
+def index_version(collection_name):
+    """Version stamp of the saved index: its current generation, None when not built."""
+    return current_generation(index_path(collection_name))
+
+
+def manifest_path(collection_name):
+    return os.path.join(PERSIST_DIR, collection_name, "manifest.json")
+
 
+def load_manifest(collection_name):
+    path = manifest_path(collection_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-def build_index(collection_name, file):
+
+def chunking(chunk_size, chunk_overlap):
+    return {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+
+
+def write_manifest(collection_name, file, docs, spec, chunk_size, chunk_overlap):
+    """Records which chunk ids the index holds, its settings and which source file state produced them."""
+    st = os.stat(file)
+    manifest = {
+        "source": file,
+        "source_version": [st.st_mtime_ns, st.st_size],
+        "index": spec,
+        "chunking": chunking(chunk_size, chunk_overlap),
+        "chunks": {
+            d.metadata["doc_id"]: {"url": d.metadata["url"], "offset": d.metadata["offset"]} for d in docs
+        },
+    }
+    tmp = manifest_path(collection_name) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path(collection_name))
+
+
+def load_documents(file, chunk_size=500, chunk_overlap=50):
+    """Chunks a knowledge base file in one streaming pass; ids are deterministic."""
+    unique = {}
+    for d in iter_documents(file, chunk_size, chunk_overlap):
+        # a page scraped twice yields the same ids, keep one copy
+        unique.setdefault(d.metadata["doc_id"], d)
+    print(f"[debug] Extracted {len(unique)} chunks from {file}")
+    return list(unique.values())
+
+
+def build_index(collection_name, file, force=False, chunk_size=500, chunk_overlap=50, spec=None):
+    """
+    Builds the FAISS index for a collection (index type from spec, flat by default).
+    With force=True an existing index is rebuilt; chunks whose text is already in the
+    embedding cache are not re-embedded.
+    """
     store_dir = os.path.join(PERSIST_DIR, collection_name)
     os.makedirs(store_dir, exist_ok=True)
 
-    if index_exists(collection_name):
+    if index_exists(collection_name) and not force:
         print(f"Skipping build for {collection_name}, already exists.")
         return
 
-    chunks = load_json_file(file)
-    texts = [c["content"] for c in chunks]
-    metadatas = [{"url": c["url"], "doc_id": c["doc_id"]} for c in chunks]
-
-    # Split into smaller chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = text_splitter.create_documents(texts=texts, metadatas=metadatas)
+    docs = load_documents(file, chunk_size, chunk_overlap)
 
     # Build FAISS index
-    vectorstore = FAISS.from_documents(docs, embedding_function)
+    spec = spec or INDEX_DEFAULTS
+    vectorstore = build_vectorstore(docs, embedding_function, spec)
 
-    # Save index locally
-    faiss_index_path = os.path.join(store_dir, "index.faiss")
-    vectorstore.save_local(faiss_index_path)
+    # Save index locally, with the BM25 index over the same chunks beside it
+    save_vectorstore(vectorstore, index_path(collection_name))
+    build_lexical(collection_name, vectorstore)
+    write_manifest(collection_name, file, docs, spec, chunk_size, chunk_overlap)
     print(f"Indexed {len(docs)} chunks into {collection_name}.")
 
 
-def mmr_rerank(query_embedding, candidate_embeddings, candidate_texts, alpha=0.5, top_k=4):
+def sync_index(collection_key):
     """
-    Simple Maximal Marginal Relevance (MMR) reranker.
-    - candidate_embeddings: embeddings of retrieved documents
-    - candidate_texts: original document objects
+    Brings a collection's index in line with its knowledge base file without a full rebuild.
+    Chunks are diffed by id against the manifest: removed chunks are deleted, new ones
+    are embedded and added, and a chunk whose text changed at the same url/offset is
+    replaced. IVF-PQ / HNSW indices are rebuilt instead (from cached embeddings).
+    Returns a dict of counts plus the ids that left the index.
     """
-    import numpy as np
+    col = COLLECTIONS[collection_key]
+    name, file = col["name"], col["file"]
+    spec = index_spec(collection_key)
+
+    manifest = load_manifest(name)
+    # a changed index type / parameters or chunking needs a full rebuild
+    if (
+        not index_exists(name)
+        or manifest is None
+        or manifest.get("index") != spec
+        or manifest.get("chunking") != chunking(col["chunk_size"], col["chunk_overlap"])
+    ):
+        build_index(name, file, force=True, chunk_size=col["chunk_size"], chunk_overlap=col["chunk_overlap"], spec=spec)
+        chunks = load_manifest(name)["chunks"]
+        # new chunk boundaries give new ids; answers built on the old chunks must go
+        removed = [i for i in (manifest or {}).get("chunks", {}) if i not in chunks]
+        return {"collection": name, "added": len(chunks), "deleted": 0, "replaced": 0, "removed_ids": removed}
+
+    st = os.stat(file)
+    if manifest.get("source_version") == [st.st_mtime_ns, st.st_size]:
+        return {"collection": name, "added": 0, "deleted": 0, "replaced": 0, "removed_ids": []}
 
-    selected = []
-    remaining = list(range(len(candidate_texts)))
-    similarity = lambda x, y: np.dot(x, y) / (np.linalg.norm(x) * np.linalg.norm(y))
+    docs = load_documents(file, col["chunk_size"], col["chunk_overlap"])
+    wanted = {d.metadata["doc_id"]: d for d in docs}
+    indexed = manifest["chunks"]
 
-    while len(selected) < top_k and remaining:
-        scores = []
-        for i in remaining:
-            sim_to_query = similarity(query_embedding, candidate_embeddings[i])
-            sim_to_selected = max([similarity(candidate_embeddings[i], candidate_embeddings[j]) for j in selected], default=0)
-            score = alpha * sim_to_query - (1 - alpha) * sim_to_selected
-            scores.append(score)
-        best_idx = remaining[np.argmax(scores)]
-        selected.append(best_idx)
-        remaining.remove(best_idx)
+    removed = [i for i in indexed if i not in wanted]
+    added = [i for i in wanted if i not in indexed]
+    # same position on the same page with new text counts as a replacement
+    old_positions = {(indexed[i]["url"], indexed[i]["offset"]) for i in removed}
+    replaced = sum(1 for i in added if (wanted[i].metadata["url"], wanted[i].metadata["offset"]) in old_positions)
 
-    return [candidate_texts[i] for i in selected]
+    # work on a private copy so searches on the cached store are never disturbed
+    vectorstore = load_vectorstore(index_path(name), embedding_function, spec) if spec["type"] == "flat" else None
+    if vectorstore is None or not supports_removal(vectorstore.index):
+        # trained / graph indices are rebuilt; only the added chunks need the model
+        vectorstore = build_vectorstore(docs, embedding_function, spec)
+    else:
+        if removed:
+            vectorstore.delete(removed)
+        if added:
+            vectorstore.add_documents([wanted[i] for i in added], ids=added)
 
+    save_vectorstore(vectorstore, index_path(name))
+    build_lexical(name, vectorstore)
+    write_manifest(name, file, docs, spec, col["chunk_size"], col["chunk_overlap"])
+    print(f"Synced {name}: +{len(added) - replaced} new, -{len(removed) - replaced} deleted, {replaced} replaced.")
+    return {
+        "collection": name,
+        "added": len(added) - replaced,
+        "deleted": len(removed) - replaced,
+        "replaced": replaced,
+        "removed_ids": removed,
+    }
 
-def rag_search(query, collection_key, k=4, fetch_k=75, alpha=0.5):
+
+def build_lexical(collection_name, vectorstore):
+    """(Re)writes the BM25 inverted index for every chunk in the vectorstore."""
+    ids = list(vectorstore.index_to_docstore_id.values())
+    texts = [vectorstore.docstore.search(i).page_content for i in ids]
+    build_lexical_index(lexical_path(collection_name), ids, texts)
+
+
+def get_retriever(collection_key):
     """
-    FAISS-based RAG search with MMR reranking.
+    (vectorstore, positions) of a collection from one cache entry, so the docstore id ->
+    index position map always belongs to the index being searched. The index is loaded
+    once per process and only reloaded when the files on disk change.
     """
     col = COLLECTIONS[collection_key]
-    store_dir = os.path.join(PERSIST_DIR, col["name"])
-    faiss_index_path = os.path.join(store_dir, "index.faiss")
+    name = col["name"]
+
+    version = index_version(name)
+    cached = _retrievers.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
 
-    # Load FAISS index
-    vectorstore = FAISS.load_local(faiss_index_path, embedding_function, allow_dangerous_deserialization=True)
+    with _retrievers_lock:
+        # another thread may have loaded it while we were waiting
+        cached = _retrievers.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
 
-    # Retrieve more than k for reranking
-    docs = vectorstore.similarity_search(query, k=fetch_k)
+        with span("index_load", collection=name, built=version is None) as s:
+            if version is None:
+                spec = index_spec(collection_key)
+                build_index(name, col["file"], chunk_size=col["chunk_size"], chunk_overlap=col["chunk_overlap"], spec=spec)
+                version = index_version(name)
 
-    # Compute embeddings for reranking
-    candidate_embeddings = [embedding_function.embed_query(d.page_content) for d in docs]
+            # load the generation the version names, even if a newer one was saved meanwhile
+            vectorstore = load_vectorstore(index_path(name), embedding_function, index_spec(collection_key), version)
+            positions = {doc_id: pos for pos, doc_id in vectorstore.index_to_docstore_id.items()}
+            _retrievers[name] = (version, vectorstore, positions)
+            s.set(vectors=vectorstore.index.ntotal)
+        return vectorstore, positions
 
-    # Compute query embedding
+
+def get_vectorstore(collection_key):
+    """Returns the in-memory FAISS store for a collection."""
+    return get_retriever(collection_key)[0]
+
+
+def get_positions(collection_key):
+    """Maps docstore id -> position in the FAISS index for the loaded collection."""
+    return get_retriever(collection_key)[1]
+
+
+def get_lexical_index(collection_key):
+    """BM25 index of a collection; built from the docstore the first time it is missing."""
+    name = COLLECTIONS[collection_key]["name"]
+    lexical = load_lexical_index(lexical_path(name))
+    if lexical is None:
+        with _lexical_lock:
+            lexical = load_lexical_index(lexical_path(name))
+            if lexical is None:
+                build_lexical(name, get_vectorstore(collection_key))
+                lexical = load_lexical_index(lexical_path(name))
+    return lexical
+
+
+def warmup_retrievers():
+    """Loads every collection so the first ticket does not pay for it."""
+    for key in COLLECTIONS:
+        get_vectorstore(key)
+        if HYBRID_SEARCH:
+            get_lexical_index(key)
+
+
+def clear_retrievers():
+    with _retrievers_lock:
+        _retrievers.clear()
+
+
+def collection_candidates(collection_key, query, query_embedding, fetch_k):
+    """
+    Ranked candidates for one collection, with their stored vectors so reranking never
+    re-embeds them. In hybrid mode the vector ranking is fused (RRF) with BM25 hits.
+    Returns (docstore ids, docs, vectors).
+    """
+    vectorstore, positions = get_retriever(collection_key)
+
+    with span("similarity_search", collection=collection_key, fetch_k=fetch_k) as s:
+        q = np.asarray([query_embedding], dtype=np.float32)
+        if getattr(vectorstore, "_normalize_L2", False):
+            q /= np.linalg.norm(q, axis=1, keepdims=True)
+        _, hits = vectorstore.index.search(q, fetch_k)
+        ranking = [vectorstore.index_to_docstore_id[int(p)] for p in hits[0] if p != -1]
+        s.set(vector_hits=len(ranking))
+
+        if HYBRID_SEARCH:
+            lexical = get_lexical_index(collection_key)
+            # exact tokens (error codes, SDK methods) that the embedding misses
+            lexical_ranking = [i for i, _ in lexical.search(query, fetch_k) if i in positions]
+            ranking = reciprocal_rank_fusion([ranking, lexical_ranking])[:fetch_k]
+            s.set(lexical_hits=len(lexical_ranking))
+        s.set(candidates=len(ranking))
+
+    if not ranking:
+        return [], [], np.empty((0, q.shape[1]), dtype=np.float32)
+    # candidate vectors are read back from the index, not re-embedded
+    with span("candidate_vectors", collection=collection_key, candidates=len(ranking)):
+        vectors = vectorstore.index.reconstruct_batch(np.array([positions[i] for i in ranking], dtype=np.int64))
+        docs = [vectorstore.docstore.search(i) for i in ranking]
+    return ranking, docs, vectors
+
+
+def to_results(docs, collections):
+    return [
+        {
+            "content": d.page_content,
+            "url": d.metadata.get("url"),
+            "doc_id": d.metadata.get("doc_id"),
+            "offset": d.metadata.get("offset"),
+            "collection": collection,
+        }
+        for d, collection in zip(docs, collections)
+    ]
+
+
+def rag_search(query, collection_key, k=TOP_K, fetch_k=FETCH_K, alpha=MMR_ALPHA):
+    """
+    FAISS-based RAG search (optionally hybrid with BM25) with MMR reranking.
+    """
+    # Compute query embedding (the only model call per search)
     query_embedding = embedding_function.embed_query(query)
 
+    # Retrieve more than k for reranking, along with their stored vectors
+    _, docs, candidate_embeddings = collection_candidates(collection_key, query, query_embedding, fetch_k)
+
     # Apply MMR rerank
-    top_docs = mmr_rerank(query_embedding, candidate_embeddings, docs, alpha=alpha, top_k=k)
+    with span("mmr", candidates=len(docs), k=k):
+        top_docs = mmr_rerank(query_embedding, candidate_embeddings, docs, alpha=alpha, top_k=k)
+    return to_results(top_docs, [collection_key] * len(top_docs))
+
+
+def rag_search_all(query, k=TOP_K, fetch_k=FETCH_K, alpha=MMR_ALPHA):
+    """
+    Searches every collection concurrently with a single query embedding, merges the
+    per-collection rankings with reciprocal rank fusion and applies MMR to the fused list.
+    No classification step is needed.
+    """
+    query_embedding = embedding_function.embed_query(query)
+
+    def search(key):
+        return key, collection_candidates(key, query, query_embedding, fetch_k)
+
+    rankings, candidates = [], {}
+    for key, (ids, docs, vectors) in _search_pool.map(bind(search), COLLECTIONS):
+        ranking = []
+        for doc_id, doc, vector in zip(ids, docs, vectors):
+            candidates[(key, doc_id)] = (doc, vector)
+            ranking.append((key, doc_id))
+        rankings.append(ranking)
+
+    fused = reciprocal_rank_fusion(rankings)[:fetch_k]
+    if not fused:
+        return []
+
+    docs = [candidates[uid][0] for uid in fused]
+    vectors = np.stack([candidates[uid][1] for uid in fused])
+    collection_of = {id(candidates[uid][0]): uid[0] for uid in fused}
+
+    with span("mmr", candidates=len(docs), k=k):
+        top_docs = mmr_rerank(query_embedding, vectors, docs, alpha=alpha, top_k=k)
+    return to_results(top_docs, [collection_of[id(d)] for d in top_docs])
+
 
-    return [{"content": d.page_content, "url": d.metadata.get("url")} for d in top_docs]
+if __name__ == "__main__":
+    # refresh every collection after a scraper run: python -m rag_system.vector_store
+    for key in COLLECTIONS:
+        sync_index(key)
@@ -0,0 +1,311 @@
+"""
+Incremental sitemap scraper shared by the knowledge-base scrapers.
+
+Only pages that may have changed are downloaded:
+  - a page whose sitemap <lastmod> matches the previous run is kept without a request
+  - other known pages are fetched conditionally (If-None-Match / If-Modified-Since),
+    a 304 keeps the previous record
+  - a page that is downloaded again but extracts to the same text (content hash) counts
+    as unchanged
+
+The work runs as three stages connected by bounded queues, so a slow stage holds the
+ones before it back instead of piling up pages in memory:
+
+    fetch (asyncio + aiohttp, one pooled connector, capped per host)
+      -> parse (process pool, lxml; see scrapers/extract.py)
+      -> write (JSON lines, validators)
+
+Records are written as they arrive, followed by the kept ones, and the file is swapped
+in when the run completes, so the indexer never reads a half-written knowledge base.
+Per-page validators are kept in <output>.state.json next to the output.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+SITEMAP_NS = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRIES = 2
+
+# marks the end of a queue's input
+_DONE = object()
+
+
+class StageStats:
+    """
+    Items handled, errors and busy time of one stage. items_per_busy_s is the stage's own
+    speed; items_per_s is over the whole run (wall clock), including time spent waiting.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.max_queue = 0
+
+    def add(self, seconds, error=False):
+        self.items += 1
+        self.busy += seconds
+        if error:
+            self.errors += 1
+
+    def watch(self, queue):
+        self.max_queue = max(self.max_queue, queue.qsize())
+
+    def summary(self, wall):
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "busy_s": round(self.busy, 3),
+            "items_per_s": round(self.items / wall, 2) if wall else 0.0,
+            "items_per_busy_s": round(self.items / self.busy, 2) if self.busy else 0.0,
+            "max_queue": self.max_queue,
+        }
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def state_path(output):
+    return os.path.splitext(output)[0] + ".state.json"
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def load_records(path):
+    """url -> record from a previous run's output (JSON lines, or a JSON array from older runs)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = json.load(f)
+    return {r["url"]: r for r in records}
+
+
+async def get(session, url, headers=None):
+    """GET with a couple of retries on transient errors. Returns (status, headers, body text)."""
+    for attempt in range(RETRIES + 1):
+        try:
+            async with session.get(url, headers=headers) as r:
+                if r.status in RETRY_STATUS and attempt < RETRIES:
+                    raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                r.raise_for_status()
+                body = await r.text(encoding="utf-8", errors="replace") if r.status != 304 else ""
+                return r.status, r.headers, body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, "status", None)
+            if attempt >= RETRIES or (status is not None and status not in RETRY_STATUS):
+                raise
+            await asyncio.sleep(random.uniform(0, 0.5 * 2**attempt))
+
+
+async def fetch_sitemap(session, url):
+    """(loc, lastmod or None) for every page, following nested sitemap indexes."""
+    _, _, text = await get(session, url)
+    root = ET.fromstring(text.encode("utf-8"))
+
+    if root.tag.endswith("sitemapindex"):
+        pages = []
+        for sm in root.findall("ns:sitemap", SITEMAP_NS):
+            pages.extend(await fetch_sitemap(session, sm.find("ns:loc", SITEMAP_NS).text.strip()))
+        return pages
+
+    pages = []
+    for node in root.findall("ns:url", SITEMAP_NS):
+        lastmod = node.find("ns:lastmod", SITEMAP_NS)
+        pages.append((node.find("ns:loc", SITEMAP_NS).text.strip(), lastmod.text.strip() if lastmod is not None else None))
+    return pages
+
+
+async def fetch_stage(session, todo, parsed, to_parse, stats):
+    """Conditional GETs; 304s skip the parse stage."""
+    while True:
+        item = await todo.get()
+        if item is _DONE:
+            return
+        url, lastmod, entry = item
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        start = time.perf_counter()
+        try:
+            status, resp_headers, html = await get(session, url, headers)
+        except Exception as e:
+            stats.add(time.perf_counter() - start, error=True)
+            await parsed.put(("failed", url, lastmod, entry, None, {}, e))
+            continue
+        stats.add(time.perf_counter() - start)
+
+        validators = {"etag": resp_headers.get("ETag"), "last_modified": resp_headers.get("Last-Modified")}
+        if status == 304:
+            await parsed.put(("not_modified", url, lastmod, entry, None, validators, None))
+        else:
+            await to_parse.put((url, lastmod, entry, html, validators))
+        stats.watch(to_parse)
+
+
+async def parse_stage(pool, extract, to_parse, parsed, stats):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await to_parse.get()
+        if item is _DONE:
+            return
+        url, lastmod, entry, html, validators = item
+        start = time.perf_counter()
+        try:
+            page = await loop.run_in_executor(pool, extract, html)
+        except Exception as e:
+            stats.add(time.perf_counter() - start, error=True)
+            await parsed.put(("failed", url, lastmod, entry, None, {}, e))
+            continue
+        stats.add(time.perf_counter() - start)
+        await parsed.put(("fetched", url, lastmod, entry, {"url": url, **page}, validators, None))
+        stats.watch(parsed)
+
+
+async def write_stage(out, parsed, previous, keep, new_state, counts, stats):
+    while True:
+        item = await parsed.get()
+        if item is _DONE:
+            return
+        status, url, lastmod, entry, record, validators, error = item
+        start = time.perf_counter()
+
+        if status == "failed":
+            print(f"Failed scraping {url}: {error}")
+            counts["failed"] += 1
+            # keep what we had; the next run tries again
+            if url in previous:
+                keep.append(url)
+                new_state[url] = entry
+        elif status == "not_modified":
+            if url in previous:
+                keep.append(url)
+                counts["not_modified"] += 1
+                new_state[url] = {**entry, "lastmod": lastmod, **{k: v for k, v in validators.items() if v}}
+            else:
+                # validators without a record (e.g. output deleted): fetch unconditionally next time
+                counts["failed"] += 1
+        else:
+            digest = content_hash(record["content"])
+            old = previous.get(url)
+            old_digest = entry.get("hash") or (content_hash(old["content"]) if old else None)
+            if old is None:
+                counts["new"] += 1
+            elif digest == old_digest:
+                counts["unchanged"] += 1
+            else:
+                counts["changed"] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            new_state[url] = {"lastmod": lastmod, **validators, "hash": digest}
+        stats.add(time.perf_counter() - start)
+
+
+async def scrape_async(sitemap_url, match, extract, output, workers=10, per_host=4, parse_workers=None, timeout=15, queue_size=32):
+    """
+    Scrapes the sitemap pages for which match(url) is true into `output` (JSON lines of
+    {"url", "title", "headings", "code_blocks", "content"}), re-downloading only what
+    changed since the previous run. extract(html) -> dict with at least "content"; it runs
+    in a process pool, so it must be picklable (a module-level function or a partial of one).
+    Returns the counts per outcome plus per-stage stats.
+    """
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    state_file = state_path(output)
+    state = load_state(state_file)
+    previous = load_records(output)
+    counts = Counter()
+    stages = {name: StageStats(name) for name in ("fetch", "parse", "write")}
+
+    start_time = time.time()
+    # one pooled connector: keep-alive connections shared by all fetchers, capped per host
+    connector = aiohttp.TCPConnector(limit=workers, limit_per_host=per_host)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={"User-Agent": "customer-support-copilot-scraper"},
+    ) as session:
+        pages = [(u, lastmod) for u, lastmod in await fetch_sitemap(session, sitemap_url) if match(u)]
+        print(f"Found {len(pages)} matching pages in {sitemap_url}")
+
+        keep, todo = [], asyncio.Queue()
+        for url, lastmod in pages:
+            entry = state.get(url, {})
+            if lastmod and entry.get("lastmod") == lastmod and url in previous:
+                keep.append(url)
+                counts["skipped"] += 1
+            else:
+                todo.put_nowait((url, lastmod, entry))
+
+        new_state = {url: state[url] for url in keep}
+        parse_workers = parse_workers or os.cpu_count() or 2
+        to_parse = asyncio.Queue(maxsize=queue_size)
+        parsed = asyncio.Queue(maxsize=queue_size)
+        tmp = output + ".tmp"
+
+        with open(tmp, "w", encoding="utf-8") as out, ProcessPoolExecutor(max_workers=parse_workers) as pool:
+            writer = asyncio.create_task(write_stage(out, parsed, previous, keep, new_state, counts, stages["write"]))
+            parsers = [
+                asyncio.create_task(parse_stage(pool, extract, to_parse, parsed, stages["parse"]))
+                for _ in range(parse_workers)
+            ]
+            fetchers = [
+                asyncio.create_task(fetch_stage(session, todo, parsed, to_parse, stages["fetch"]))
+                for _ in range(workers)
+            ]
+            for _ in fetchers:
+                todo.put_nowait(_DONE)
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await to_parse.put(_DONE)
+            await asyncio.gather(*parsers)
+            await parsed.put(_DONE)
+            await writer
+
+            for url in keep:
+                out.write(json.dumps(previous[url], ensure_ascii=False) + "\n")
+
+    os.replace(tmp, output)
+    save_state(state_file, new_state)
+    counts["removed"] = len(set(previous) - set(new_state))
+
+    wall = time.time() - start_time
+    print(
+        f"Scraped {len(new_state)} pages in {wall:.2f} seconds: "
+        + ", ".join(f"{k} {counts[k]}" for k in ("new", "changed", "unchanged", "not_modified", "skipped", "removed", "failed"))
+    )
+    summary = {name: s.summary(wall) for name, s in stages.items()}
+    for name, s in summary.items():
+        print(f"  {name:>5}: {s['items']} items ({s['errors']} errors), {s['items_per_s']}/s overall, {s['items_per_busy_s']}/s busy ({s['busy_s']}s), max queue {s['max_queue']}")
+    return {**counts, "stages": summary}
+
+
+def scrape(sitemap_url, match, extract, output, **kwargs):
+    """Blocking scrape_async for scripts."""
+    return asyncio.run(scrape_async(sitemap_url, match, extract, output, **kwargs))
@@ -0,0 +1,94 @@
+"""
+Structured text extraction with lxml, run in the parse stage's worker processes.
+Keeps the page's structure in the text: headings become markdown-style "## ..." lines,
+<pre> blocks are kept verbatim as fenced code, paragraphs are separated by blank lines.
+Navigation, footers, forms and scripts are dropped by tag instead of trimming a fixed
+number of characters.
+"""
+import lxml.html
+
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "dd", "details", "div", "dl", "dt",
+    "figcaption", "figure", "li", "main", "ol", "p", "section", "summary", "table", "td", "th", "tr", "ul",
+}
+# page chrome and widgets, never part of the content
+DROP_XPATH = (
+    ".//script | .//style | .//noscript | .//template | .//nav | .//footer | .//aside | .//form | .//button"
+    " | .//*[contains(concat(' ', normalize-space(@class), ' '), ' headerlink ')]"
+)
+
+
+def _squash(text):
+    return " ".join(text.split())
+
+
+class _Text:
+    def __init__(self):
+        self.parts = []
+        self.buf = []
+
+    def inline(self, text):
+        if text:
+            self.buf.append(text)
+
+    def flush(self):
+        text = _squash(" ".join(self.buf))
+        if text:
+            self.parts.append(text)
+        self.buf = []
+
+    def block(self, text):
+        self.flush()
+        self.parts.append(text)
+
+
+def _walk(el, out, page):
+    tag = el.tag
+    if tag in HEADINGS:
+        text = _squash(el.text_content())
+        if text:
+            out.block("#" * int(tag[1]) + " " + text)
+            page["headings"].append(text)
+        return
+    if tag == "pre":
+        code = el.text_content().strip("\n")
+        if code.strip():
+            out.block("```\n" + code + "\n```")
+            page["code_blocks"] += 1
+        return
+
+    block = tag in BLOCK_TAGS
+    if block:
+        out.flush()
+    out.inline(el.text)
+    for child in el:
+        # comments and processing instructions have a non-string tag
+        if isinstance(child.tag, str):
+            _walk(child, out, page)
+        out.inline(child.tail)
+    if block:
+        out.flush()
+
+
+def extract_page(html, roots=("main", "article", "body")):
+    """
+    {"title", "headings", "code_blocks", "content"} for the first of `roots` found in the
+    page. Use functools.partial to fix `roots`, the result stays picklable for the pool.
+    """
+    doc = lxml.html.fromstring(html)
+    root = next((el for el in (doc.find(f".//{tag}") for tag in roots) if el is not None), None)
+    page = {"title": "", "headings": [], "code_blocks": 0, "content": ""}
+    if root is None:
+        return page
+
+    for el in root.xpath(DROP_XPATH):
+        el.drop_tree()
+    out = _Text()
+    _walk(root, out, page)
+    out.flush()
+
+    title = doc.find(".//title")
+    page["title"] = page["headings"][0] if page["headings"] else _squash(title.text_content()) if title is not None else ""
+    page["content"] = "\n\n".join(out.parts)
+    return page
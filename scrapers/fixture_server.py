@@ -0,0 +1,119 @@
+"""
+Local stand-in for the documentation sites, so the scrapers can run offline.
+Serves every .html file under a directory (scrapers/fixtures by default) at its path
+without the extension, plus a generated /sitemap.xml with <lastmod> taken from the file
+modification times. Pages carry an ETag and Last-Modified and answer conditional requests
+with 304, like the real sites. Edit or touch a fixture to make it "change".
+
+    python -m scrapers.fixture_server --port 8765
+    python -m scrapers.scraper_documentation --sitemap http://127.0.0.1:8765/sitemap.xml --output /tmp/docs.jsonl
+"""
+import argparse
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def make_handler(directory):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def pages(self):
+            for root, _, files in os.walk(directory):
+                for name in sorted(files):
+                    if name.endswith(".html"):
+                        path = os.path.join(root, name)
+                        yield "/" + os.path.relpath(path, directory)[: -len(".html")].replace(os.sep, "/"), path
+
+        def send_body(self, body, content_type, headers=()):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def sitemap(self):
+            base = f"http://{self.headers.get('Host')}"
+            urls = []
+            for page, path in self.pages():
+                lastmod = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(timespec="seconds")
+                urls.append(f"  <url><loc>{escape(base + page)}</loc><lastmod>{lastmod}</lastmod></url>")
+            return (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n' + "\n".join(urls) + "\n</urlset>\n"
+            ).encode("utf-8")
+
+        def not_modified(self, etag, mtime):
+            if "If-None-Match" in self.headers:
+                return self.headers["If-None-Match"] == etag
+            since = self.headers.get("If-Modified-Since")
+            if since:
+                try:
+                    return int(mtime) <= parsedate_to_datetime(since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/") or "/"
+            if path == "/sitemap.xml":
+                self.send_body(self.sitemap(), "application/xml")
+                return
+
+            file = dict(self.pages()).get(path)
+            if file is None:
+                self.send_error(404)
+                return
+            with open(file, "rb") as f:
+                body = f.read()
+            mtime = os.path.getmtime(file)
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            headers = [("ETag", etag), ("Last-Modified", formatdate(mtime, usegmt=True))]
+
+            if self.not_modified(etag, mtime):
+                self.send_response(304)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+            self.send_body(body, "text/html; charset=utf-8", headers)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def serve(directory=FIXTURES_DIR, host="127.0.0.1", port=0):
+    """Starts the server in a background thread. Returns (server, base url); stop with server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), make_handler(directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default=FIXTURES_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.dir))
+    print(f"Serving {args.dir} at http://{args.host}:{args.port}/sitemap.xml")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,37 @@
-import json
-import os
-import time
-import xml.etree.ElementTree as ET
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+from functools import partial
 
-import requests
-from bs4 import BeautifulSoup
+from scrapers.engine import scrape
+from scrapers.extract import extract_page
 
-output_path = "knowledge_base/atlan_developer.json"
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
+output_path = "knowledge_base/atlan_developer.jsonl"
 
 # using only most used keywords from the developer webpage
 sitemap_url = "https://developer.atlan.com/sitemap.xml"
 keywords = ["concepts", "conventions", "sdks", "snippets"]
 
-resp = requests.get(sitemap_url)
-resp.raise_for_status()
+extract = partial(extract_page, roots=("article",))
 
-root = ET.fromstring(resp.text)
-namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
 
-urls = [
-    url.find("ns:loc", namespace).text
-    for url in root.findall("ns:url", namespace)
-    if any(kw in url.find("ns:loc", namespace).text for kw in keywords)
-]
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sitemap", default=sitemap_url)
+    parser.add_argument("--output", default=output_path)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--per-host", type=int, default=4, help="concurrent requests per host")
+    parser.add_argument("--parse-workers", type=int, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
 
-print(f"Found {len(urls)} pages matching keywords {keywords}")
+    scrape(
+        args.sitemap,
+        lambda u: any(kw in u for kw in keywords),
+        extract,
+        args.output,
+        workers=args.workers,
+        per_host=args.per_host,
+        parse_workers=args.parse_workers,
+    )
 
-def scrape_page(u):
-    try:
-        r = requests.get(u, timeout=15)
-        r.encoding = "utf-8"
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        main_content = soup.find("article")
-        text = main_content.get_text(" ", strip=True) if main_content else ""
-        return {"url": u, "content": text[:-185]}
-    except Exception as e:
-        print(f"Failed scraping {u}: {e}")
-        return None
 
-data = []
-
-start_time = time.time()
-print("Scraping started...")
-
-with ThreadPoolExecutor(max_workers=10) as executor:  # reduces time by 80%
-    futures = {executor.submit(scrape_page, u): u for u in urls}
-    for future in as_completed(futures):
-        result = future.result()
-        if result:
-            data.append(result)
-
-end_time = time.time()
-
-print(f"Scraped {len(data)} pages successfully")
-print(f"Time taken: {end_time - start_time:.2f} seconds")
-
-with open(output_path, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
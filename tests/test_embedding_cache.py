@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+from rag_system.embedding_cache import EmbeddingStore  # noqa: E402
+
+
+def vectors(n, start=0, dim=4):
+    return np.arange(start * dim, (start + n) * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_append_after_torn_write(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    store.put_many(["a", "b"], vectors(2))
+
+    # a writer died mid-append: half a vector row, and one without its log line
+    with open(store.vectors_path, "ab") as f:
+        f.write(vectors(1, 2).tobytes())
+        f.write(b"\0" * 6)
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('["x", 2')
+
+    other = EmbeddingStore(tmp_path)
+    other.put_many(["c"], vectors(1, 5))
+    fresh = EmbeddingStore(tmp_path)
+    got = fresh.get_many(["a", "b", "c"])
+    np.testing.assert_array_equal(got["c"], vectors(1, 5)[0])
+    np.testing.assert_array_equal(got["b"], vectors(1, 1)[0])
+
+    with open(store.log_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line) for line in lines[1:]] == [["a", 0], ["b", 1], ["c", 2]]
@@ -0,0 +1,97 @@
+import sqlite3
+
+from job_queue import DONE, QUEUED, RUNNING, JobQueue, priority_rank
+
+
+def test_priority_rank_reads_analysis_labels():
+    assert priority_rank("P0 (High)") == 0
+    assert priority_rank("P1 (Medium)") == 1
+    assert priority_rank("P2 (Low)") == 2
+    assert priority_rank("P0") == 0
+    assert priority_rank(None) == priority_rank("") == 3
+
+
+def test_p0_ticket_claimed_before_p2(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue("TICKET-1", priority_rank("P2 (Low)"))
+    queue.enqueue("TICKET-2", priority_rank("P0 (High)"))
+
+    assert queue.claim("w")["ticket_id"] == "TICKET-2"
+    assert queue.claim("w")["ticket_id"] == "TICKET-1"
+    assert queue.claim("w") is None
+
+
+def test_enqueue_dedupes_by_ticket_id(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    assert queue.enqueue_many([("TICKET-1", 2), ("TICKET-1", 0)]) == ["TICKET-1"]
+    job = queue.get("TICKET-1")
+    assert job["status"] == QUEUED and job["priority"] == 0
+
+    queue.claim("w")
+    queue.finish("TICKET-1", "w")
+    assert queue.get("TICKET-1")["status"] == DONE
+    assert queue.enqueue_many([("TICKET-1", 0)]) == []
+    assert queue.enqueue_many([("TICKET-1", 0)], retry=True) == ["TICKET-1"]
+    assert queue.claim("w")["status"] == RUNNING
+
+
+def test_requeue_stale_recovers_dead_worker_jobs(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue("TICKET-1", 0)
+    # a worker of a process that no longer exists, claimed just now
+    queue.claim("answer-worker-999999999-0")
+
+    assert queue.requeue_stale(lease_s=600) == 1
+    assert queue.get("TICKET-1")["status"] == QUEUED
+
+
+def test_requeue_stale_after_lease(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue("TICKET-1", 0)
+    queue.claim("w")
+    assert queue.requeue_stale(lease_s=600) == 0
+
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET started_at = started_at - 601")
+    assert queue.requeue_stale(lease_s=600) == 1
+
+
+def test_finish_ignores_worker_whose_job_was_requeued(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue("TICKET-1", 0)
+    queue.claim("old")
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET started_at = started_at - 601")
+    queue.requeue_stale(lease_s=600)
+    queue.claim("new")
+
+    assert not queue.finish("TICKET-1", "old", error="late")
+    assert queue.get("TICKET-1")["status"] == RUNNING
+    assert queue.finish("TICKET-1", "new")
+    assert queue.get("TICKET-1")["status"] == DONE
+
+
+def test_progress_only_from_the_running_worker(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.enqueue("TICKET-1", 0)
+    queue.claim("w")
+    queue.progress("TICKET-1", "w", "Partial ans")
+    queue.progress("TICKET-1", "other", "stale")
+    assert queue.get("TICKET-1")["partial"] == "Partial ans"
+
+    queue.finish("TICKET-1", "w")
+    assert queue.get("TICKET-1")["partial"] is None
+
+
+def test_adds_partial_column_to_older_queues(tmp_path):
+    path = tmp_path / "jobs.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (ticket_id TEXT PRIMARY KEY, priority INTEGER NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, error TEXT, worker TEXT, enqueued_at REAL NOT NULL,"
+            " started_at REAL, finished_at REAL)"
+        )
+    queue = JobQueue(path)
+    queue.enqueue("TICKET-1", 0)
+    assert queue.claim("w")["partial"] is None
+    JobQueue(path)
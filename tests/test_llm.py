@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+
+from rag_system import llm  # noqa: E402
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Local stand-in: behaviour(call number, timeout) returns the answer text or raises."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        return StubResponse(self.behaviour(n, (request_options or {}).get("timeout")))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(llm, "LLM_BACKOFF_MAX", 0.01)
+    models = []
+
+    def install(behaviour):
+        model = StubModel(behaviour)
+        models.append(model)
+        llm.set_model_factory(lambda model_name, generation_config: model)
+        return model
+
+    yield install
+    llm.set_model_factory(None)
+
+
+def test_retries_transient_errors(stub):
+    def behaviour(n, timeout):
+        if n <= 2:
+            raise google_exceptions.ServiceUnavailable("busy")
+        return "ok"
+
+    model = stub(behaviour)
+    assert llm.generate("m", "key", "prompt").text == "ok"
+    assert model.calls == 3
+
+
+def test_non_retryable_error_is_raised_at_once(stub):
+    def behaviour(n, timeout):
+        raise google_exceptions.InvalidArgument("bad request")
+
+    model = stub(behaviour)
+    with pytest.raises(google_exceptions.InvalidArgument):
+        llm.generate("m", "key", "prompt")
+    assert model.calls == 1
+
+
+def test_deadline_bounds_all_attempts(stub):
+    def behaviour(n, timeout):
+        # like the SDK: gives up after the per-attempt timeout
+        time.sleep(min(timeout, 1.0))
+        raise TimeoutError("slow")
+
+    stub(behaviour)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        llm.generate("m", "key", "prompt", deadline=0.2)
+    assert time.monotonic() - start < 0.5
+
+
+def test_hedge_wins_over_slow_request(stub):
+    def behaviour(n, timeout):
+        if n == 1:
+            time.sleep(1.0)
+            return "slow"
+        return "hedge"
+
+    model = stub(behaviour)
+    start = time.monotonic()
+    assert llm.generate("m", "key", "prompt", hedge_after=0.05).text == "hedge"
+    assert time.monotonic() - start < 0.5
+    assert model.calls == 2
+
+
+def test_circuit_opens_after_repeated_failures(stub):
+    def behaviour(n, timeout):
+        raise google_exceptions.ServiceUnavailable("down")
+
+    model = stub(behaviour)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        llm.generate("m", "key", "prompt")
+    assert model.calls == llm.LLM_CIRCUIT_FAILURES
+    assert llm.circuit_states()["m"] == "open"
+
+    with pytest.raises(llm.CircuitOpenError):
+        llm.generate("m", "key", "prompt")
+    assert model.calls == llm.LLM_CIRCUIT_FAILURES
+
+
+def test_gemini_model_builds_outside_an_event_loop():
+    # warmup, job workers and sync endpoints all run in plain threads
+    llm.set_model_factory(None)
+    result = {}
+
+    def build():
+        try:
+            result["model"] = llm.get_model("gemini-test", "key")
+        except Exception as e:
+            result["error"] = e
+
+    t = threading.Thread(target=build)
+    t.start()
+    t.join()
+    llm.set_model_factory(None)
+    assert "error" not in result, result.get("error")
+    assert result["model"]._client is not None
+
+
+def test_async_model_per_event_loop():
+    # run_tickets calls asyncio.run each time; a client bound to a closed loop cannot be reused
+    llm.set_model_factory(None)
+
+    async def model():
+        return llm.get_async_model("gemini-test", "key")
+
+    first, second = asyncio.run(model()), asyncio.run(model())
+    llm.set_model_factory(None)
+    assert first is not second
+    assert first._async_client is not second._async_client
@@ -0,0 +1,50 @@
+import json
+import sqlite3
+import threading
+
+from ticket_store import TicketStore
+
+
+def test_priority_filter_accepts_token_or_label(tmp_path):
+    store = TicketStore(tmp_path / "tickets.db")
+    store.add({"subject": "a", "body": "", "analysis": {"priority": "P0 (High)"}})
+    b = store.add({"subject": "b", "body": ""})
+    store.update(b, analysis={"priority": "P2 (Low)"})
+
+    assert [t["subject"] for t in store.list(priority="P0")] == ["a"]
+    assert [t["subject"] for t in store.list(priority="P0 (High)")] == ["a"]
+    assert [t["subject"] for t in store.list(priority="P2")] == ["b"]
+    assert store.get(b)["analysis"]["priority"] == "P2 (Low)"
+
+
+def test_full_labels_of_older_stores_are_normalized(tmp_path):
+    path = tmp_path / "tickets.db"
+    store = TicketStore(path)
+    store.add({"subject": "a", "body": "", "analysis": {"priority": "P1 (Medium)"}})
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE tickets SET priority = 'P1 (Medium)'")
+
+    assert [t["subject"] for t in TicketStore(path).list(priority="P1")] == ["a"]
+
+
+def test_concurrent_json_migration_runs_once(tmp_path):
+    analysis_file = tmp_path / "analysis_tickets.json"
+    analysis_file.write_text(json.dumps([{"id": "TICKET-1", "subject": "a", "body": ""}]))
+    path = tmp_path / "tickets.db"
+    TicketStore(path)
+    results, errors = [], []
+
+    def migrate():
+        try:
+            results.append(TicketStore(path).migrate_from_json(analysis_file))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(results) == [0, 0, 0, 1]
+    assert len(TicketStore(path).list()) == 1
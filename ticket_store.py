@@ -0,0 +1,222 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id        TEXT PRIMARY KEY,
+    seq       INTEGER NOT NULL,
+    subject   TEXT NOT NULL,
+    body      TEXT NOT NULL,
+    status    TEXT,
+    priority  TEXT,
+    analysis  TEXT,
+    answer    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+CREATE INDEX IF NOT EXISTS idx_tickets_priority ON tickets(priority);
+CREATE INDEX IF NOT EXISTS idx_tickets_subject ON tickets(subject);
+CREATE INDEX IF NOT EXISTS idx_tickets_seq ON tickets(seq);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# first id handed out is TICKET-245, same as the JSON-based numbering
+FIRST_TICKET_NUMBER = 245
+
+
+def priority_token(priority):
+    """Leading token of a priority label: "P0 (High)" -> "P0". None when missing."""
+    if not priority or not priority.strip():
+        return None
+    return priority.split()[0].upper()
+
+
+def _row_to_ticket(row):
+    ticket = {"id": row["id"], "subject": row["subject"], "body": row["body"]}
+    if row["status"] is not None:
+        ticket["status"] = row["status"]
+    if row["analysis"] is not None:
+        ticket["analysis"] = json.loads(row["analysis"])
+    if row["answer"] is not None:
+        ticket["answer"] = row["answer"]
+    return ticket
+
+
+def _ticket_number(ticket_id):
+    if ticket_id and ticket_id.startswith("TICKET-") and ticket_id[7:].isdigit():
+        return int(ticket_id[7:])
+    return None
+
+
+class TicketStore:
+    """
+    SQLite (WAL) ticket repository. Rows are read and written one at a time by id,
+    status/priority are indexed columns and ids come from an atomic counter, so
+    several Streamlit sessions can work on the same store.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.execute(
+            "INSERT OR IGNORE INTO counters (name, value) VALUES ('ticket', ?)",
+            (FIRST_TICKET_NUMBER - 1,),
+        )
+        conn.commit()
+        self._normalize_priorities(conn)
+
+    def _normalize_priorities(self, conn):
+        # stores written before the priority column held the bare token kept the full label
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            labels = [r[0] for r in conn.execute("SELECT DISTINCT priority FROM tickets WHERE priority IS NOT NULL")]
+            for label in labels:
+                if priority_token(label) != label:
+                    conn.execute("UPDATE tickets SET priority = ? WHERE priority = ?", (priority_token(label), label))
+
+    def _conn(self):
+        # one connection per thread (Streamlit runs each session in its own thread)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def next_id(self):
+        """Allocates the next TICKET-N id atomically."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'ticket'")
+            value = conn.execute("SELECT value FROM counters WHERE name = 'ticket'").fetchone()[0]
+        return f"TICKET-{value}"
+
+    def _bump_counter(self, conn, ticket_id):
+        # keep the counter ahead of explicitly supplied ids
+        number = _ticket_number(ticket_id)
+        if number is not None:
+            conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'ticket'", (number,))
+
+    def add(self, ticket):
+        """Inserts a ticket, allocating an id when it has none. Returns the id."""
+        if not ticket.get("id"):
+            ticket["id"] = self.next_id()
+        conn = self._conn()
+        with conn:
+            self._insert(conn, ticket)
+        return ticket["id"]
+
+    def _insert(self, conn, ticket):
+        analysis = ticket.get("analysis")
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO tickets (id, seq, subject, body, status, priority, analysis, answer)
+            VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM tickets), ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                ticket["id"],
+                ticket.get("subject", ""),
+                ticket.get("body", ""),
+                ticket.get("status"),
+                priority_token(analysis.get("priority")) if analysis else None,
+                json.dumps(analysis) if analysis is not None else None,
+                ticket.get("answer"),
+            ),
+        )
+        self._bump_counter(conn, ticket["id"])
+
+    def get(self, ticket_id):
+        row = self._conn().execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        return _row_to_ticket(row) if row else None
+
+    def list(self, status=None, priority=None):
+        """Tickets in creation order; priority matches "P0" as well as "P0 (High)"."""
+        query, args = "SELECT * FROM tickets", []
+        filters = []
+        if status is not None:
+            filters.append("status = ?")
+            args.append(status)
+        if priority is not None:
+            filters.append("priority = ?")
+            args.append(priority_token(priority))
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        query += " ORDER BY seq"
+        return [_row_to_ticket(r) for r in self._conn().execute(query, args)]
+
+    def subjects(self):
+        return {r[0] for r in self._conn().execute("SELECT subject FROM tickets")}
+
+    def _update(self, conn, ticket_id, fields):
+        columns, args = [], []
+        for key in ("subject", "body", "status", "answer"):
+            if key in fields:
+                columns.append(f"{key} = ?")
+                args.append(fields[key])
+        if "analysis" in fields:
+            analysis = fields["analysis"]
+            columns += ["analysis = ?", "priority = ?"]
+            args += [
+                json.dumps(analysis) if analysis is not None else None,
+                priority_token(analysis.get("priority")) if analysis else None,
+            ]
+        if columns:
+            conn.execute(f"UPDATE tickets SET {', '.join(columns)} WHERE id = ?", args + [ticket_id])
+
+    def update(self, ticket_id, **fields):
+        """Updates only the given fields of one ticket (status, answer, analysis, ...)."""
+        conn = self._conn()
+        with conn:
+            self._update(conn, ticket_id, fields)
+
+    def update_many(self, updates):
+        """Applies [(ticket_id, fields), ...] in a single transaction."""
+        conn = self._conn()
+        with conn:
+            for ticket_id, fields in updates:
+                self._update(conn, ticket_id, fields)
+
+    def migrate_from_json(self, analysis_file, last_id_file=None):
+        """One-time import of analysis_tickets.json / last_id.txt. Does nothing once done."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+            return 0
+
+        analysis_file = Path(analysis_file)
+        tickets = []
+        if analysis_file.exists():
+            with analysis_file.open("r") as f:
+                tickets = json.load(f)
+
+        with conn:
+            # another process opening the same fresh store may have migrated meanwhile
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return 0
+            for t in tickets:
+                if t.get("id"):
+                    self._insert(conn, t)
+            if last_id_file is not None and Path(last_id_file).exists():
+                last_id = int(Path(last_id_file).read_text().strip())
+                conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'ticket'", (last_id,))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated_json', ?)", (str(analysis_file),))
+
+        if tickets:
+            print(f"Migrated {len(tickets)} tickets from {analysis_file}")
+        return len(tickets)